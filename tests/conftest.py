@@ -0,0 +1,174 @@
+import json
+import struct
+import threading
+import time
+import zlib
+from types import SimpleNamespace
+from typing import Any, List
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from tofula.src.structures import StoryBeat, StoryOutline, StoryOutput
+
+STORY_INPUT = dict(
+    themes="friendship",
+    child_name="Sam",
+    age=5,
+    reading_level="early",
+    length=4,
+    tone="warm",
+    style="watercolor",
+)
+
+
+def _make_story(title: str = "The Test", pages: int = 4, **fields) -> StoryOutput:
+    beats = [
+        StoryBeat(page=page, summary=f"{title} page {page}.")
+        for page in range(1, pages + 1)
+    ]
+    return StoryOutput(
+        title=title,
+        outline=StoryOutline(title=title, beats=beats),
+        draft=f"Draft of {title}.",
+        story_final="\n\n".join(beat.summary for beat in beats),
+        **fields,
+    )
+
+
+@pytest.fixture
+def make_story():
+    """Factory for small StoryOutput objects."""
+    return _make_story
+
+
+def png_bytes(width: int, height: int, color=(200, 80, 80)) -> bytes:
+    """Encode a solid-color RGB PNG without third-party libraries."""
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        body = kind + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body))
+
+    row = b"\x00" + bytes(color) * width
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(row * height))
+        + chunk(b"IEND", b"")
+    )
+
+
+class FakeProviders:
+    """
+    Deterministic stand-ins for the chat models and the image client.
+
+    Replies are chosen from the system prompt of each call. Attributes can be
+    changed by tests: delays, number of outline pages, how many moderation
+    calls reject the story, and the raw illustration-prompt reply.
+    """
+
+    def __init__(self):
+        self.pages = 4
+        self.chat_delay = 0.0
+        self.image_delay = 0.0
+        self.image_size = (64, 64)
+        self.unsafe_replies = 0
+        self.illustration_reply = None
+        self.image_calls: List[Any] = []
+        self.events: List[tuple] = []
+        self._lock = threading.Lock()
+
+    def event(self, name: str, start: float) -> None:
+        with self._lock:
+            self.events.append((name, start, time.perf_counter()))
+
+    def reply(self, messages) -> str:
+        system = messages[0].content
+        if "story templates" in system:
+            return json.dumps(
+                {"theme": "friendship", "template_id": "t1", "beats": ["a", "b"]}
+            )
+        if "structured outlines" in system:
+            beats = [
+                {"page": page, "summary": f"Page {page} happens."}
+                for page in range(1, self.pages + 1)
+            ]
+            return json.dumps(
+                {"title": "The Test", "beats": beats, "vocabulary_targets": []}
+            )
+        if "Expand the outline" in system:
+            return "Draft story. " * 10
+        if "content moderator" in system:
+            with self._lock:
+                unsafe = self.unsafe_replies > 0
+                self.unsafe_replies -= unsafe
+            if unsafe:
+                return json.dumps({"is_safe": False, "reason": "too scary"})
+            return json.dumps({"is_safe": True})
+        if "illustration prompts" in system:
+            if self.illustration_reply is not None:
+                return self.illustration_reply
+            prompts = [
+                {"page": page, "prompt": f"draw page {page}"}
+                for page in range(1, self.pages + 1)
+            ]
+            return "```json\n" + json.dumps({"prompts": prompts}) + "\n```"
+        return "\n\n".join(
+            f"Polished page {page} text." for page in range(1, self.pages + 1)
+        )
+
+    def generate_content(self, model, contents, config=None):
+        start = time.perf_counter()
+        with self._lock:
+            self.image_calls.append(contents)
+        time.sleep(self.image_delay)
+        self.event("image", start)
+        part = SimpleNamespace(
+            inline_data=SimpleNamespace(
+                data=png_bytes(*self.image_size), mime_type="image/png"
+            ),
+            text=None,
+        )
+        return SimpleNamespace(
+            candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))]
+        )
+
+
+class FakeChat(BaseChatModel):
+    providers: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.providers.chat_delay)
+        message = AIMessage(content=self.providers.reply(messages))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        text = self.providers.reply(messages)
+        for i in range(0, len(text), 7):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text[i : i + 7]))
+
+
+@pytest.fixture
+def fake_providers(monkeypatch):
+    """Patch the pipeline (and cassette recording) to use FakeProviders."""
+    import tofula.src.pipeline as pipeline_module
+    import tofula.src.recording as recording_module
+
+    providers = FakeProviders()
+    client = SimpleNamespace(
+        models=SimpleNamespace(generate_content=providers.generate_content)
+    )
+    for module in (pipeline_module, recording_module):
+        monkeypatch.setattr(
+            module,
+            "get_chat_llm",
+            lambda model, temperature: FakeChat(providers=providers),
+        )
+        monkeypatch.setattr(module, "get_image_client", lambda model: (client, model))
+    return providers
@@ -0,0 +1,48 @@
+"""
+Tests for stage budgets and the request timeouts derived from them.
+"""
+
+import time
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from tofula.src.deadline import Deadline, DeadlineExceeded, request_timeout
+from tofula.src.llm_factory import StageTimeoutChatGoogle
+
+
+def test_request_timeout_follows_stage_budget():
+    assert request_timeout() is None
+    assert Deadline().run("outline", request_timeout) is None
+
+    deadline = Deadline(10)
+    assert 9 < deadline.run("outline", request_timeout) <= 10
+    # Optional stages only get their weighted share
+    assert deadline.run("polish", request_timeout, required=False) < 3
+    assert request_timeout() is None
+
+
+def test_abandoned_stage_raises_without_waiting():
+    deadline = Deadline(0.2)
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        deadline.run("outline", time.sleep, 1.0)
+    assert time.monotonic() - start < 0.5
+
+
+def test_gemini_chat_request_gets_stage_timeout(monkeypatch):
+    timeouts = []
+
+    def fake_generate(self, messages, stop=None, run_manager=None, **kwargs):
+        timeouts.append(kwargs.get("timeout"))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage("ok"))])
+
+    monkeypatch.setattr(ChatGoogleGenerativeAI, "_generate", fake_generate)
+    llm = StageTimeoutChatGoogle(model="gemini-2.0-flash-lite", google_api_key="x")
+
+    llm.invoke("hello")
+    Deadline(5).run("draft", llm.invoke, "hello")
+    assert timeouts[0] is None
+    assert 4 < timeouts[1] <= 5
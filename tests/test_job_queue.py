@@ -0,0 +1,137 @@
+"""
+Multi-process tests for the shared job queues.
+
+Several worker processes (plus one that claims a job and dies) drain the same
+queue with short leases, so expired-lease takeovers race with heartbeats,
+completions and other takeovers. Every job must end up done exactly once.
+"""
+
+import builtins
+import multiprocessing
+import os
+import random
+import time
+
+import pytest
+
+from tofula.src.job_queue import get_job_queue
+from tofula.src.worker import run_worker
+
+NUM_JOBS = 31
+NUM_WORKERS = 4
+NUM_CRASHED = 20
+LEASE_SECONDS = 0.5
+ROUNDS = 6
+
+
+class _Story:
+    def __init__(self, title: str):
+        self.title = title
+
+    def model_dump_json(self) -> str:
+        return f'{{"title": "{self.title}"}}'
+
+
+class _FakePipeline:
+    """Stands in for StoryGenerationPipeline; takes a random short time."""
+
+    def generate_story(self, output_dir: str, **payload) -> _Story:
+        time.sleep(random.uniform(0.0, 0.02))
+        return _Story(payload["name"])
+
+
+def _add_filesystem_jitter() -> None:
+    """Stall before some file operations, like a preempted or slow process."""
+    targets = [(os, name) for name in ("rename", "replace", "remove", "utime")]
+    targets += [(os, "listdir"), (os.path, "getmtime"), (builtins, "open")]
+    for module, name in targets:
+        original = getattr(module, name)
+
+        def jittered(*args, _original=original, **kwargs):
+            if random.random() < 0.1:
+                time.sleep(random.uniform(0.0, 0.1))
+            return _original(*args, **kwargs)
+
+        setattr(module, name, jittered)
+
+
+def _crashing_claimer(location: str) -> None:
+    queue = get_job_queue(location, max_attempts=2)
+    for _ in range(NUM_CRASHED):
+        queue.claim("crasher", LEASE_SECONDS)
+    os._exit(1)
+
+
+def _worker(location: str, worker_id: str) -> None:
+    _add_filesystem_jitter()
+    queue = get_job_queue(location, max_attempts=2)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        run_worker(
+            queue,
+            _FakePipeline(),
+            worker_id=worker_id,
+            lease_seconds=LEASE_SECONDS,
+            exit_when_empty=True,
+        )
+        stats = queue.stats()
+        if stats["pending"] == 0 and stats["running"] == 0:
+            break
+        time.sleep(0.05)
+    queue.close()
+
+
+def _run_round(location: str) -> None:
+    queue = get_job_queue(location, max_attempts=2)
+    job_ids = [queue.enqueue({"name": f"job{i}"}) for i in range(NUM_JOBS)]
+
+    ctx = multiprocessing.get_context("fork")
+    crasher = ctx.Process(target=_crashing_claimer, args=(location,))
+    crasher.start()
+    crasher.join()
+
+    workers = [
+        ctx.Process(target=_worker, args=(location, f"w{i}"))
+        for i in range(NUM_WORKERS)
+    ]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(60)
+        assert process.exitcode == 0
+
+    assert queue.stats() == {
+        "pending": 0,
+        "running": 0,
+        "done": NUM_JOBS,
+        "failed": 0,
+    }
+    for i, job_id in enumerate(job_ids):
+        assert queue.result(job_id) == f'{{"title": "job{i}"}}'
+    queue.close()
+
+
+@pytest.mark.parametrize("name", ["queue.sqlite", "queue_dir"])
+def test_workers_drain_queue_with_crashed_claimer(tmp_path, name):
+    # The races are timing dependent, so replay the scenario a few times
+    for round_index in range(ROUNDS):
+        _run_round(str(tmp_path / f"{round_index}_{name}"))
+
+
+@pytest.mark.parametrize("name", ["queue.sqlite", "queue_dir"])
+def test_lost_lease_cannot_finish_newer_attempt(tmp_path, name):
+    queue = get_job_queue(str(tmp_path / name), max_attempts=3)
+    job_id = queue.enqueue({"name": "job"})
+
+    stale = queue.claim("a", 0.1)
+    time.sleep(0.2)
+    current = queue.claim("b", 10)
+    assert current.job_id == job_id and current.attempts == 2
+
+    assert not queue.heartbeat(stale, 10)
+    assert not queue.complete(stale, "stale")
+    assert not queue.fail(stale, "stale")
+    assert queue.heartbeat(current, 10)
+    assert queue.complete(current, "current")
+    assert queue.result(job_id) == "current"
+    assert queue.stats()["done"] == 1
@@ -0,0 +1,35 @@
+"""
+Tests for the moderation repair loop.
+"""
+
+import pytest
+from conftest import STORY_INPUT
+
+from tofula.src.pipeline import ModerationRejected, StoryGenerationPipeline
+
+
+def test_repaired_story_records_stats(fake_providers, tmp_path):
+    fake_providers.unsafe_replies = 1
+    pipeline = StoryGenerationPipeline(max_repair_attempts=2)
+    story = pipeline.generate_story(**STORY_INPUT, output_dir=str(tmp_path))
+
+    repair = story.metadata["moderation_repair"]
+    assert repair["attempts"] == 1
+    assert repair["reasons"] == ["too scary"]
+    assert repair["seconds"] >= 0
+
+
+def test_rejected_story_keeps_repair_stats(fake_providers, tmp_path, caplog):
+    fake_providers.unsafe_replies = 3
+    pipeline = StoryGenerationPipeline(max_repair_attempts=2)
+    with pytest.raises(ModerationRejected) as excinfo:
+        pipeline.generate_story(**STORY_INPUT, output_dir=str(tmp_path))
+
+    repair = excinfo.value.repair_stats
+    assert repair["attempts"] == 2
+    assert repair["reasons"] == ["too scary"] * 3
+    assert repair["seconds"] > 0
+    assert isinstance(excinfo.value, ValueError)
+    assert "too scary" in str(excinfo.value)
+    (record,) = [r for r in caplog.records if hasattr(r, "moderation_repair")]
+    assert record.moderation_repair is repair
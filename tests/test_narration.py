@@ -0,0 +1,102 @@
+"""
+Narration tests with the offline speech engine and fake model providers.
+"""
+
+import os
+import wave
+
+import pytest
+from conftest import STORY_INPUT
+
+from tofula.src import tracing
+from tofula.src.narration import AudioCache, OfflineTTSBackend
+from tofula.src.pipeline import StoryGenerationPipeline
+from tofula.src.recording import Cassette, CassetteMiss
+
+
+class _RemoteOfflineBackend(OfflineTTSBackend):
+    """Offline audio posing as a network backend, for cassette tests."""
+
+    name = "gemini"
+    remote = True
+
+    def __init__(self):
+        super().__init__(latency=0.01)
+        self.calls = 0
+
+    def synthesize(self, text: str, voice: str) -> bytes:
+        self.calls += 1
+        return super().synthesize(text, voice)
+
+
+def _audio_path(uri: str) -> str:
+    assert uri.startswith("audio://")
+    return uri[len("audio://") :]
+
+
+def _spans(tracer, name):
+    return [span for span in tracer._spans if span.name == name]
+
+
+def test_offline_narration_is_cached_and_overlaps_images(fake_providers, tmp_path):
+    fake_providers.image_delay = 0.1
+    pipeline = StoryGenerationPipeline(
+        tts_backend=OfflineTTSBackend(latency=0.05),
+        audio_cache=AudioCache(str(tmp_path / "cache")),
+        max_tts_concurrency=2,
+    )
+
+    tracer = tracing.Tracer()
+    with tracer.activate():
+        story = pipeline.generate_story(
+            **STORY_INPUT, generate_tts=True, output_dir=str(tmp_path / "first")
+        )
+    narration = story.metadata["narration"]
+    assert sorted(narration["pages"]) == [1, 2, 3, 4]
+    assert narration["synthesized"] == 4 and narration["cache_hits"] == 0
+    with wave.open(_audio_path(story.audio), "rb") as audio:
+        assert audio.getnframes() > 0
+
+    # Narration runs while the illustrations are being drawn
+    tts_pages = _spans(tracer, "tts_page")
+    (illustrations,) = _spans(tracer, "stage:illustrations")
+    assert len(tts_pages) == 4 and len(_spans(tracer, "image_request")) == 4
+    assert all(
+        illustrations.start_ns < span.end_ns < illustrations.end_ns
+        for span in tts_pages
+    )
+
+    story = pipeline.generate_story(
+        **STORY_INPUT, generate_tts=True, output_dir=str(tmp_path / "second")
+    )
+    narration = story.metadata["narration"]
+    assert narration["synthesized"] == 0 and narration["cache_hits"] == 4
+    assert _audio_path(story.audio).startswith(str(tmp_path / "second"))
+
+
+def test_cassette_replays_remote_narration_offline(fake_providers, tmp_path):
+    path = str(tmp_path / "cassette.json")
+    backend = _RemoteOfflineBackend()
+    recorder = Cassette(path, mode="record")
+    recorded = StoryGenerationPipeline(cassette=recorder, tts_backend=backend)
+    original = recorded.generate_story(
+        **STORY_INPUT, generate_tts=True, output_dir=str(tmp_path / "record")
+    )
+    recorder.save()
+    assert backend.calls == 4
+
+    # No backend is configured: replay must not create a live Gemini one
+    replayed = StoryGenerationPipeline(cassette=Cassette(path, mode="replay"))
+    story = replayed.generate_story(
+        **STORY_INPUT, generate_tts=True, output_dir=str(tmp_path / "replay")
+    )
+    assert backend.calls == 4
+    assert story.metadata["narration"]["synthesized"] == 4
+    with (
+        open(_audio_path(original.audio), "rb") as a,
+        open(_audio_path(story.audio), "rb") as b,
+    ):
+        assert a.read() == b.read()
+
+    with pytest.raises(CassetteMiss):
+        replayed.cassette.tts_backend().synthesize("Hello", "unrecorded")
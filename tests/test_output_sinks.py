@@ -0,0 +1,71 @@
+"""Tests for batch output sinks."""
+
+import json
+import os
+import sqlite3
+
+import pytest
+
+from tofula.src.output_sinks import SINK_TYPES, get_output_sink
+
+
+@pytest.fixture(params=sorted(SINK_TYPES))
+def sink_path(request, tmp_path):
+    names = {"jsonl": "s.jsonl", "sqlite": "s.sqlite3", "dir": "stories"}
+    return request.param, str(tmp_path / names[request.param])
+
+
+def _stored_ids(kind: str, path: str):
+    if kind == "jsonl":
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line)["id"] for line in f]
+    if kind == "sqlite":
+        with sqlite3.connect(path) as conn:
+            return [row[0] for row in conn.execute("SELECT id FROM stories")]
+    return [name[: -len(".json")] for name in os.listdir(path)]
+
+
+def test_duplicate_id_keeps_buffered_stories(sink_path, make_story):
+    kind, path = sink_path
+    with get_output_sink(kind, path, max_buffered=4) as sink:
+        for i in range(3):
+            sink.write(make_story(f"y{i}"), story_id=f"y{i}")
+        with pytest.raises(ValueError):
+            sink.write(make_story("dup"), story_id="y1")
+        assert sink.pending == 3
+    assert sorted(_stored_ids(kind, path)) == ["y0", "y1", "y2"]
+    assert sink.written == 3
+
+
+def test_failed_flush_is_retried(sink_path, make_story, monkeypatch):
+    kind, path = sink_path
+    sink = get_output_sink(kind, path, max_buffered=2)
+    original = type(sink)._write_batch
+    calls = {"n": 0}
+
+    def flaky(self, records):
+        calls["n"] += 1
+        if calls["n"] == 1:
+            raise OSError("disk full")
+        return original(self, records)
+
+    monkeypatch.setattr(type(sink), "_write_batch", flaky)
+    sink.write(make_story("a"), story_id="a")
+    with pytest.raises(OSError):
+        sink.write(make_story("b"), story_id="b")
+    assert sink.pending == 2 and sink.written == 0
+    sink.write(make_story("c"), story_id="c")
+    sink.close()
+    assert sorted(_stored_ids(kind, path)) == ["a", "b", "c"]
+
+
+def test_sqlite_rejects_ids_from_an_earlier_run(tmp_path, make_story):
+    path = str(tmp_path / "s.sqlite3")
+    with get_output_sink("sqlite", path) as sink:
+        sink.write(make_story("first"), story_id="story_1")
+    with get_output_sink("sqlite", path) as sink:
+        with pytest.raises(ValueError):
+            sink.write(make_story("second"), story_id="story_1")
+    with sqlite3.connect(path) as conn:
+        titles = [row[0] for row in conn.execute("SELECT title FROM stories")]
+    assert titles == ["first"]
@@ -0,0 +1,93 @@
+"""
+Tests that exports through a PdfRenderCache match plain ReportLab exports.
+"""
+
+import threading
+
+import pytest
+from conftest import png_bytes
+
+from tofula.src.pdf_export import PdfRenderCache, save_story_to_pdf
+
+pytest.importorskip("reportlab")
+pytest.importorskip("PIL")
+pypdf = pytest.importorskip("pypdf")
+
+COLORS = [(200, 80, 80), (80, 200, 80), (80, 80, 200), (200, 200, 80)]
+
+
+def _write_image(path, color):
+    path.write_bytes(png_bytes(32, 24, color))
+    return f"image://{path}"
+
+
+def _story(make_story, tmp_path):
+    story = make_story(pages=4)
+    story.illustrations = {
+        page: _write_image(tmp_path / f"page_{page}.png", COLORS[page - 1])
+        for page in range(1, 5)
+    }
+    return story
+
+
+def _contents(pdf_path):
+    """Text and embedded image data of every page."""
+    reader = pypdf.PdfReader(str(pdf_path))
+    return [
+        (page.extract_text(), [image.data for image in page.images])
+        for page in reader.pages
+    ]
+
+
+def _assert_matches_plain(story, cache, tmp_path, name):
+    save_story_to_pdf(story, str(tmp_path / f"{name}_plain.pdf"))
+    save_story_to_pdf(story, str(tmp_path / f"{name}_cached.pdf"), cache=cache)
+    plain = _contents(tmp_path / f"{name}_plain.pdf")
+    assert _contents(tmp_path / f"{name}_cached.pdf") == plain
+    return plain
+
+
+def test_cached_export_matches_plain_export(make_story, tmp_path):
+    story = _story(make_story, tmp_path)
+    cache = PdfRenderCache()
+
+    cold = _assert_matches_plain(story, cache, tmp_path, "cold")
+    assert cache.stats["page_hits"] == 0 and cache.enabled
+    assert len(cold) == 5 and all(len(images) == 1 for _, images in cold[1:])
+
+    _assert_matches_plain(story, cache, tmp_path, "warm")
+    assert cache.stats["page_hits"] == 5
+
+    # Swap one illustration and edit another page's text
+    story.illustrations[2] = _write_image(tmp_path / "swapped.png", (10, 10, 10))
+    story.outline.beats[2].summary = "An edited page."
+    edited = _assert_matches_plain(story, cache, tmp_path, "edited")
+    assert cache.stats["page_hits"] == 8 and cache.enabled
+    assert edited[2][1] != cold[2][1]
+    assert "An edited page." in edited[3][0]
+
+
+def test_concurrent_exports_share_cache(make_story, tmp_path):
+    story = _story(make_story, tmp_path)
+    save_story_to_pdf(story, str(tmp_path / "plain.pdf"))
+    expected = _contents(tmp_path / "plain.pdf")
+    # Small enough that exports keep evicting each other's images
+    cache = PdfRenderCache(max_images=2, max_pages=3)
+    errors = []
+
+    def _export(index):
+        try:
+            for round_index in range(5):
+                path = tmp_path / f"{index}_{round_index}.pdf"
+                save_story_to_pdf(story, str(path), cache=cache)
+                assert _contents(path) == expected
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=_export, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert cache.enabled
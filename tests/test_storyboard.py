@@ -0,0 +1,51 @@
+"""
+Tests for storyboard-sheet illustrations.
+"""
+
+import struct
+
+import pytest
+from conftest import STORY_INPUT
+
+from tofula.src.pipeline import StoryGenerationPipeline
+from tofula.src.structures import IllustrationPrompt
+
+pytest.importorskip("PIL")
+
+
+def _png_size(uri: str):
+    with open(uri[len("image://") :], "rb") as f:
+        header = f.read(24)
+    return struct.unpack(">II", header[16:24])
+
+
+def test_pages_are_spread_evenly_over_sheets(fake_providers, tmp_path):
+    fake_providers.image_size = (400, 300)
+    pipeline = StoryGenerationPipeline(storyboard_pages=3, page_aspect_ratio=0.75)
+    story = pipeline.generate_story(**STORY_INPUT, output_dir=str(tmp_path))
+
+    # 4 pages of at most 3 per sheet: 2 + 2, not 3 + 1
+    prompts = [contents[-1] for contents in fake_providers.image_calls]
+    assert len(prompts) == 2
+    assert all("grid of 1 rows by 2 columns" in prompt for prompt in prompts)
+    sizes = {_png_size(story.illustrations[page]) for page in range(1, 5)}
+    assert len(sizes) == 1
+
+
+def test_single_page_group_uses_page_prompt(fake_providers, tmp_path):
+    pipeline = StoryGenerationPipeline(storyboard_pages=3)
+    prompts = (
+        IllustrationPrompt(page=page, prompt=f"draw page {page}")
+        for page in range(1, 5)
+    )
+    # Without an expected page count, a lazy stream is cut into full sheets
+    images, stats = pipeline._generate_illustration_images(
+        prompts, story_summary="A test story.", output_dir=str(tmp_path)
+    )
+
+    assert sorted(images) == [1, 2, 3, 4]
+    assert stats["image_calls"] == 2
+    sheet, single = [contents[-1] for contents in fake_providers.image_calls]
+    assert "storyboard sheet" in sheet
+    assert "storyboard sheet" not in single
+    assert "draw page 4" in single
@@ -0,0 +1,86 @@
+"""
+Tests for incremental parsing of streamed illustration prompts.
+"""
+
+import json
+import logging
+
+from conftest import STORY_INPUT
+
+from tofula.src.pipeline import StoryGenerationPipeline
+from tofula.src.streaming import IncrementalPromptParser
+
+
+def _feed_chars(parser, text):
+    """Feed one character at a time; return (position, prompt) pairs."""
+    found = []
+    for position, char in enumerate(text):
+        found.extend((position, prompt) for prompt in parser.feed(char))
+    return found
+
+
+def _document(prompts):
+    return json.dumps({"prompts": prompts}, indent=2)
+
+
+def test_prompts_complete_at_their_closing_brace():
+    prompts = [{"page": page, "prompt": f"draw page {page}"} for page in (1, 2, 3)]
+    text = "```json\n" + _document(prompts) + "\n```"
+    parser = IncrementalPromptParser()
+
+    found = _feed_chars(parser, text)
+    assert [(p.page, p.prompt) for _, p in found] == [
+        (1, "draw page 1"),
+        (2, "draw page 2"),
+        (3, "draw page 3"),
+    ]
+    # Each prompt is emitted as soon as its object is closed
+    for position, prompt in found:
+        assert text[position] == "}"
+        assert text[: position + 1].endswith(f'"draw page {prompt.page}"\n    }}')
+    assert parser.done
+    assert parser.text == text
+    assert parser.feed("more") == []
+
+
+def test_brackets_and_quotes_inside_strings():
+    tricky = 'a {curly} [square] "quoted" \\ back ]} end'
+    prompts = [
+        {"page": 1, "prompt": tricky},
+        {"page": 2, "prompt": "}]"},
+        {"page": 3, "prompt": '\\"'},
+    ]
+    parser = IncrementalPromptParser()
+
+    found = _feed_chars(parser, _document(prompts))
+    assert [p.prompt for _, p in found] == [tricky, "}]", '\\"']
+    assert parser.done
+
+
+def test_malformed_objects_are_skipped():
+    text = (
+        '{"prompts": [{"page": "one", "prompt": "x"}, {"page": 2}, '
+        '{"page": 3, "prompt": "ok", "nested": {"a": [1, 2]}}, '
+        '{"page": 4 "prompt": "no comma"}, {"page": 5, "prompt": "last"}]}'
+    )
+    parser = IncrementalPromptParser()
+
+    found = _feed_chars(parser, text)
+    assert [p.page for _, p in found] == [3, 5]
+    assert parser.done
+
+
+def test_unparsed_stream_falls_back_to_full_parse(fake_providers, tmp_path, caplog):
+    prompts = [{"page": page, "prompt": f"draw page {page}"} for page in range(1, 5)]
+    # Valid JSON the incremental parser cannot match: the key is escaped
+    fake_providers.illustration_reply = _document(prompts).replace(
+        '"prompts"', '"\\u0070rompts"'
+    )
+    pipeline = StoryGenerationPipeline()
+
+    with caplog.at_level(logging.WARNING):
+        story = pipeline.generate_story(**STORY_INPUT, output_dir=str(tmp_path))
+
+    assert "Incremental prompt parsing failed" in caplog.text
+    assert sorted(story.illustrations) == [1, 2, 3, 4]
+    assert len(fake_providers.image_calls) == 4
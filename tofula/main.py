@@ -9,13 +9,23 @@ and runs a single demo story generation.
 """
 
 import os
+import json
 import logging
+import uuid
+from contextlib import nullcontext
 from datetime import datetime
 from argparse import ArgumentParser
 from dotenv import load_dotenv
 
+from tofula.src.job_queue import get_job_queue
+from tofula.src.narration import TTS_BACKENDS, AudioCache, get_tts_backend
+from tofula.src.output_sinks import SINK_TYPES, get_output_sink
 from tofula.src.pdf_export import save_story_to_pdf
 from tofula.src.pipeline import StoryGenerationPipeline
+from tofula.src.recording import Cassette, run_replay_load_test
+from tofula.src.template_index import TemplateIndex
+from tofula.src.worker import run_worker
+from tofula.src import tracing
 
 
 # Set up logging
@@ -24,6 +34,13 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+PIPELINE_MODELS = {
+    "story_model": "gemini-2.0-flash-exp",
+    "moderation_model": "gemini-2.0-flash-lite",
+    "polish_model": "gemini-2.0-flash-exp",
+    "image_model": "gemini-2.5-flash-image",
+}
+
 
 def _parse_args():
     parser = ArgumentParser(description="Generate a personalized children's story.")
@@ -64,41 +81,315 @@ def _parse_args():
         default="watercolor, bright colors, Middle Eastern patterns, soft watercolor",
         help="Art style description for illustrations.",
     )
+    parser.add_argument(
+        "--inputs-file",
+        default=None,
+        help="JSON file with a list of story inputs to generate as a batch.",
+    )
+    parser.add_argument(
+        "--sink",
+        choices=list(SINK_TYPES.keys()),
+        default=None,
+        help="Write each finished story to an output sink (jsonl, sqlite, dir).",
+    )
+    parser.add_argument(
+        "--sink-path",
+        default=None,
+        help="File or directory the output sink writes to.",
+    )
+    parser.add_argument(
+        "--sink-buffer",
+        type=int,
+        default=1,
+        help="Maximum number of finished stories kept in memory before flushing.",
+    )
+    parser.add_argument(
+        "--drop-draft",
+        action="store_true",
+        help="Do not persist the intermediate draft in the output sink.",
+    )
+    parser.add_argument(
+        "--record",
+        default=None,
+        metavar="CASSETTE",
+        help="Record all model calls, responses and latencies to a cassette file.",
+    )
+    parser.add_argument(
+        "--replay",
+        default=None,
+        metavar="CASSETTE",
+        help="Serve model calls from a recorded cassette instead of the network.",
+    )
+    parser.add_argument(
+        "--time-scale",
+        type=float,
+        default=1.0,
+        help="Multiplier for recorded latencies on replay (0 disables delays).",
+    )
+    parser.add_argument(
+        "--load-test",
+        type=int,
+        default=0,
+        metavar="N",
+        help="With --replay, generate N stories from the cassette and report stats.",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Number of stories generated concurrently in a replay load test.",
+    )
+    parser.add_argument(
+        "--storyboard-pages",
+        type=int,
+        default=1,
+        help="Pages drawn per image call as one storyboard sheet (1 = per page).",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        default=None,
+        help="Per-story time budget in seconds; slow stages degrade gracefully.",
+    )
+    parser.add_argument(
+        "--trace",
+        default=None,
+        metavar="PATH",
+        help="Write a Chrome trace-event timeline of the run (open in Perfetto).",
+    )
+    parser.add_argument(
+        "--tts",
+        choices=list(TTS_BACKENDS.keys()),
+        default=None,
+        help="Narrate each page with this TTS backend (offline = local placeholder).",
+    )
+    parser.add_argument(
+        "--tts-voice",
+        default=None,
+        help="Voice name passed to the TTS backend.",
+    )
+    parser.add_argument(
+        "--max-repair-attempts",
+        type=int,
+        default=2,
+        help="Rewrites of a story rejected by moderation before giving up.",
+    )
+    parser.add_argument(
+        "--image-attempts",
+        type=int,
+        default=1,
+        help="Attempts per image call (default 1, no retries).",
+    )
+    parser.add_argument(
+        "--template-index",
+        default=None,
+        metavar="PATH",
+        help="Reuse story templates for similar themes from this index file.",
+    )
+    parser.add_argument(
+        "--template-threshold",
+        type=float,
+        default=0.9,
+        help="Minimum theme similarity (0-1) for a template index hit.",
+    )
+
+    subparsers = parser.add_subparsers(dest="command")
+    worker = subparsers.add_parser(
+        "worker",
+        help="Generate stories for jobs from a shared queue (pipeline options "
+        "go before the command).",
+    )
+    worker.add_argument(
+        "--queue",
+        required=True,
+        help="Shared queue: a .sqlite/.sqlite3/.db file or a directory.",
+    )
+    worker.add_argument("--worker-id", default=None, help="Name of this worker.")
+    worker.add_argument(
+        "--lease-seconds",
+        type=float,
+        default=120.0,
+        help="Job lease length; renewed by heartbeats every third of it.",
+    )
+    worker.add_argument(
+        "--poll-interval",
+        type=float,
+        default=2.0,
+        help="Seconds to wait before polling an empty queue again.",
+    )
+    worker.add_argument(
+        "--max-jobs", type=int, default=None, help="Stop after this many jobs."
+    )
+    worker.add_argument(
+        "--exit-when-empty",
+        action="store_true",
+        help="Stop once the queue has no job available.",
+    )
+    worker.add_argument(
+        "--max-attempts",
+        type=int,
+        default=3,
+        help="Deliveries of a job (failures or expired leases) before giving up.",
+    )
+
+    enqueue = subparsers.add_parser(
+        "enqueue",
+        help="Add story jobs to a shared queue (--inputs-file goes before the "
+        "command; without it the CLI story is enqueued).",
+    )
+    enqueue.add_argument("--queue", required=True, help="Shared queue location.")
+
+    status = subparsers.add_parser("status", help="Show job counts of a queue.")
+    status.add_argument("--queue", required=True, help="Shared queue location.")
     return parser.parse_args()
 
 
-def main():
-    """CLI entry point for testing the story generation pipeline."""
-    # Load environment variables once at startup
-    load_dotenv()
+def _default_sink_path(kind: str) -> str:
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    names = {
+        "jsonl": f"stories_{timestamp}.jsonl",
+        "sqlite": f"stories_{timestamp}.sqlite3",
+        "dir": f"stories_{timestamp}",
+    }
+    return os.path.join(".", "generated", names[kind])
 
-    args = _parse_args()
-    logger.info("Starting story generation test...")
 
-    # Initialize pipeline
-    pipeline = StoryGenerationPipeline(
-        story_model="gemini-2.0-flash-exp",
-        moderation_model="gemini-2.0-flash-lite",
-        polish_model="gemini-2.0-flash-exp",
-        image_model="gemini-2.5-flash-image",
+def _input_defaults(args) -> dict:
+    """Story inputs set by CLI flags; an inputs file may override them."""
+    return {"deadline": args.deadline, "generate_tts": bool(args.tts)}
+
+
+def _run_batch(pipeline: StoryGenerationPipeline, args) -> None:
+    """Generate every story in the inputs file and stream results to a sink."""
+    with open(args.inputs_file, "r", encoding="utf-8") as f:
+        inputs = json.load(f)
+
+    # Prefixes story ids so batches sharing a sink or temp/ don't collide
+    run_id = f"{datetime.now():%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:6]}"
+    kind = args.sink or "jsonl"
+    sink_path = args.sink_path or _default_sink_path(kind)
+    logger.info("Writing %s stories to %s sink: %s", len(inputs), kind, sink_path)
+
+    sink = get_output_sink(
+        kind,
+        sink_path,
+        max_buffered=args.sink_buffer,
+        drop_draft=args.drop_draft,
     )
+    try:
+        for index, story_input in enumerate(inputs):
+            story_id = f"story_{run_id}_{index:05d}"
+            try:
+                story = pipeline.generate_story(
+                    **{**_input_defaults(args), **story_input},
+                    output_dir=os.path.join("temp", story_id),
+                )
+            except Exception as e:
+                logger.error("Story %s failed: %s", story_id, str(e))
+                continue
+            try:
+                sink.write(story, story_id=story_id)
+            except Exception as e:
+                # Buffered stories are kept and retried on the next flush
+                logger.error("Story %s could not be written: %s", story_id, str(e))
+                continue
+            logger.info("✓ Story %s finished: %s", story_id, story.title)
+    finally:
+        try:
+            sink.close()
+        except Exception as e:
+            logger.error("Could not write %s buffered stories: %s", sink.pending, e)
+
+    logger.info(
+        "✓ Batch completed: %s written, %s failed",
+        sink.written,
+        len(inputs) - sink.written,
+    )
+
+
+def _tts_backend(args):
+    """
+    Backend for --tts. Remote backends are not created when replaying; the
+    cassette serves their recorded audio instead.
+    """
+    if not args.tts:
+        return None
+    if args.replay and TTS_BACKENDS[args.tts].remote:
+        return None
+    return get_tts_backend(args.tts)
 
-    test_input = {
-        "themes": args.themes,
-        "child_name": args.child_name,
-        "age": args.age,
-        "reading_level": args.reading_level,
-        "length": args.length,
-        "tone": args.tone,
-        "style": args.style,
-        "generate_tts": False,
-    }
 
+def _template_index(args):
+    if not args.template_index:
+        return None
+    return TemplateIndex(args.template_index, threshold=args.template_threshold)
+
+
+def _log_template_index(template_index) -> None:
+    if template_index is not None:
+        logger.info("Template index stats: %s", template_index.stats)
+
+
+def _run_load_test(args, test_input: dict) -> None:
+    """Replay a cassette for many concurrent stories and print the stats."""
+    if args.inputs_file:
+        with open(args.inputs_file, "r", encoding="utf-8") as f:
+            inputs = [{**_input_defaults(args), **i} for i in json.load(f)]
+    else:
+        inputs = [test_input]
+
+    logger.info(
+        "Replaying %s stories from %s with concurrency %s",
+        args.load_test,
+        args.replay,
+        args.concurrency,
+    )
+    template_index = _template_index(args)
+    stats = run_replay_load_test(
+        args.replay,
+        inputs,
+        num_stories=args.load_test,
+        concurrency=args.concurrency,
+        time_scale=args.time_scale,
+        pdf_dir=os.path.join(".", "generated", "replay"),
+        storyboard_pages=args.storyboard_pages,
+        template_index=template_index,
+        tts_backend=_tts_backend(args),
+        tts_voice=args.tts_voice,
+        audio_cache=AudioCache() if args.tts else None,
+        **PIPELINE_MODELS,
+    )
+    if template_index is not None:
+        stats.update(
+            {f"template_index_{k}": v for k, v in template_index.stats.items()}
+        )
+
+    print("\n" + "=" * 60)
+    print("REPLAY LOAD TEST RESULTS")
+    print("=" * 60)
+    for key, value in stats.items():
+        print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
+    print("=" * 60)
+
+
+def _run(pipeline: StoryGenerationPipeline, args, test_input: dict) -> None:
+    """Generate the demo story (or a batch) with a configured pipeline."""
+    if args.inputs_file:
+        _run_batch(pipeline, args)
+        return
+
+    logger.info("Starting story generation test...")
     logger.info(f"Test input: {test_input}")
 
     # Generate story
     story = pipeline.generate_story(**test_input)
 
+    if args.sink:
+        sink_path = args.sink_path or _default_sink_path(args.sink)
+        with get_output_sink(args.sink, sink_path, drop_draft=args.drop_draft) as sink:
+            sink.write(story)
+        logger.info("✓ Story written to %s sink: %s", args.sink, sink_path)
+
     # Optional: save to PDF to visualize pages with illustrations
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     pdf_dir = os.path.join(".", "generated")
@@ -107,7 +398,8 @@ def main():
     logger.info(f"Saving story and illustrations to PDF: {pdf_path}")
 
     try:
-        save_story_to_pdf(story, pdf_path)
+        with tracing.span("pdf_export", "pdf"):
+            save_story_to_pdf(story, pdf_path)
         logger.info("✓ PDF saved successfully")
     except ImportError as e:
         logger.warning(str(e))
@@ -123,7 +415,12 @@ def main():
     print(
         f"\nIllustrations: {len(story.illustrations) if story.illustrations else 0} pages"
     )
+    if story.audio:
+        print(f"\nNarration: {story.audio}")
     print(f"\nVocabulary targets: {', '.join(story.outline.vocabulary_targets)}")
+    if story.metadata.get("degradations"):
+        print(f"\nDegradations: {', '.join(story.metadata['degradations'])}")
+        print(f"\nPending illustrations: {story.metadata['pending_illustrations']}")
     print("\n" + "=" * 60)
     print("FINAL STORY")
     print("=" * 60)
@@ -133,5 +430,102 @@ def main():
     logger.info("✓ Test completed successfully!")
 
 
+def _build_pipeline(args, cassette=None) -> StoryGenerationPipeline:
+    return StoryGenerationPipeline(
+        **PIPELINE_MODELS,
+        cassette=cassette,
+        storyboard_pages=args.storyboard_pages,
+        template_index=_template_index(args),
+        max_repair_attempts=args.max_repair_attempts,
+        max_image_attempts=args.image_attempts,
+        tts_backend=_tts_backend(args),
+        tts_voice=args.tts_voice,
+        audio_cache=AudioCache() if args.tts else None,
+    )
+
+
+def _run_queue_command(args, test_input: dict) -> None:
+    """Run the worker, enqueue or status command on a shared job queue."""
+    max_attempts = getattr(args, "max_attempts", 3)
+    with get_job_queue(args.queue, max_attempts=max_attempts) as queue:
+        if args.command == "enqueue":
+            if args.inputs_file:
+                with open(args.inputs_file, "r", encoding="utf-8") as f:
+                    inputs = json.load(f)
+            else:
+                inputs = [test_input]
+            for story_input in inputs:
+                queue.enqueue({**_input_defaults(args), **story_input})
+            logger.info("✓ Enqueued %s jobs to %s", len(inputs), args.queue)
+        elif args.command == "worker":
+            pipeline = _build_pipeline(args)
+            run_worker(
+                queue,
+                pipeline,
+                worker_id=args.worker_id,
+                lease_seconds=args.lease_seconds,
+                poll_interval=args.poll_interval,
+                max_jobs=args.max_jobs,
+                exit_when_empty=args.exit_when_empty,
+            )
+            _log_template_index(pipeline.template_index)
+        print(json.dumps(queue.stats()))
+
+
+def _start(args, test_input: dict) -> None:
+    """Run the queue command, load test, batch or demo story selected on the CLI."""
+    if args.command:
+        _run_queue_command(args, test_input)
+        return
+
+    if args.replay and args.load_test:
+        _run_load_test(args, test_input)
+        return
+
+    cassette = None
+    if args.record:
+        cassette = Cassette(args.record, mode="record")
+    elif args.replay:
+        cassette = Cassette(args.replay, mode="replay", time_scale=args.time_scale)
+
+    # Initialize pipeline
+    pipeline = _build_pipeline(args, cassette=cassette)
+
+    try:
+        _run(pipeline, args, test_input)
+    finally:
+        if args.record:
+            cassette.save()
+        _log_template_index(pipeline.template_index)
+
+
+def main():
+    """CLI entry point for testing the story generation pipeline."""
+    # Load environment variables once at startup
+    load_dotenv()
+
+    args = _parse_args()
+
+    test_input = {
+        "themes": args.themes,
+        "child_name": args.child_name,
+        "age": args.age,
+        "reading_level": args.reading_level,
+        "length": args.length,
+        "tone": args.tone,
+        "style": args.style,
+        **_input_defaults(args),
+    }
+
+    tracer = tracing.Tracer() if args.trace else None
+    try:
+        with tracer.activate() if tracer else nullcontext():
+            _start(args, test_input)
+    finally:
+        if tracer is not None:
+            tracer.export_chrome_trace(args.trace)
+            logger.info("✓ Trace written to %s", args.trace)
+
+
 if __name__ == "__main__":
     main()
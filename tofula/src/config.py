@@ -17,4 +17,9 @@ MODEL_CONFIGS = {
         "provider": "google-image",
         "temperature": 0.0,
     },
+    # Speech generation model for narration
+    "gemini-2.5-flash-preview-tts": {
+        "provider": "google-tts",
+        "temperature": 0.0,
+    },
 }
@@ -0,0 +1,152 @@
+"""
+Deadline tracking for story generation.
+
+A Deadline holds the total time budget of one generate_story call and hands
+out per-stage budgets. Stages that can degrade (e.g. polish) get their weighted
+share of whatever is left for the stages that have not run yet, so unused time
+carries over. Required stages may use all of the remaining time.
+
+Python threads cannot be cancelled: a stage that runs out of budget is
+abandoned, and its call keeps running on a detached worker thread. To bound
+that, the stage's remaining budget is available to model clients through
+``request_timeout`` and passed on as the request timeout.
+"""
+
+import contextvars
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional
+
+from tofula.src import tracing
+
+# Relative cost of each stage, in the order they run
+DEFAULT_STAGE_WEIGHTS: Dict[str, float] = {
+    "template": 1.0,
+    "outline": 1.0,
+    "draft": 1.5,
+    "polish": 1.5,
+    "moderation": 0.5,
+    "illustration_prompts": 1.0,
+    "illustrations": 5.0,
+}
+
+# Monotonic time by which the current stage must finish (set on its worker)
+_stage_end: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "tofula_stage_end", default=None
+)
+
+
+def request_timeout() -> Optional[float]:
+    """
+    Seconds left for the stage running in this context, for use as a request
+    timeout. None outside a stage with a deadline.
+    """
+    end = _stage_end.get()
+    if end is None:
+        return None
+    # Never 0, which clients read as "no timeout"
+    return max(end - time.monotonic(), 0.001)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a stage does not finish within its time budget."""
+
+
+class Deadline:
+    """
+    Time budget for a single story.
+
+    Args:
+        seconds: Total budget; None means no deadline
+        stage_weights: Relative share of the budget per stage, in run order
+    """
+
+    def __init__(
+        self,
+        seconds: Optional[float] = None,
+        stage_weights: Optional[Dict[str, float]] = None,
+    ):
+        self.seconds = seconds
+        self.stage_weights = dict(stage_weights or DEFAULT_STAGE_WEIGHTS)
+        self._start = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.seconds is not None
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self._start
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline (inf if there is no deadline)."""
+        if self.seconds is None:
+            return math.inf
+        return max(self.seconds - self.elapsed(), 0.0)
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def stage_budget(self, stage: str) -> float:
+        """Weighted share of the remaining time for ``stage`` and later stages."""
+        remaining = self.remaining()
+        if math.isinf(remaining):
+            return remaining
+        stages = list(self.stage_weights)
+        if stage not in stages:
+            return remaining
+        later = stages[stages.index(stage) :]
+        total = sum(self.stage_weights[s] for s in later)
+        return remaining * self.stage_weights[stage] / total
+
+    def run(
+        self,
+        stage: str,
+        fn: Callable[..., Any],
+        *args,
+        required: bool = True,
+        **kwargs,
+    ) -> Any:
+        """
+        Run ``fn`` within the stage budget.
+
+        Without a deadline the call runs inline. Otherwise it runs on a worker
+        thread and is abandoned with DeadlineExceeded once its budget is spent:
+        the remaining time for required stages, the weighted stage budget for
+        optional ones. An abandoned call is not cancelled; it finishes (or
+        hits its request timeout, see ``request_timeout``) in the background.
+        """
+        with tracing.span(f"stage:{stage}", "stage"):
+            if not self.enabled:
+                return fn(*args, **kwargs)
+            return self._run_with_budget(stage, fn, args, kwargs, required)
+
+    def _run_with_budget(
+        self,
+        stage: str,
+        fn: Callable[..., Any],
+        args: tuple,
+        kwargs: dict,
+        required: bool,
+    ) -> Any:
+        budget = self.remaining() if required else self.stage_budget(stage)
+        if budget <= 0:
+            raise DeadlineExceeded(f"No time left for stage '{stage}'")
+
+        executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"tofula-{stage}"
+        )
+        # Copy the context so tracing spans keep their parent on the worker
+        context = contextvars.copy_context()
+        context.run(_stage_end.set, time.monotonic() + budget)
+        future = executor.submit(context.run, fn, *args, **kwargs)
+        try:
+            return future.result(timeout=budget)
+        except FutureTimeoutError:
+            raise DeadlineExceeded(
+                f"Stage '{stage}' exceeded its budget of {budget:.1f}s"
+            ) from None
+        finally:
+            # Do not wait for an abandoned call to finish; it keeps running
+            executor.shutdown(wait=False)
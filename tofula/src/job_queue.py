@@ -0,0 +1,467 @@
+"""
+Durable job queues shared by story workers.
+
+Jobs are story inputs (generate_story keyword arguments). Any number of worker
+processes, on one or several hosts, claim jobs from the same queue:
+  - SqliteJobQueue: a SQLite database file (local disk; fine for many local
+    processes)
+  - DirectoryJobQueue: one JSON file per job in state directories, moved with
+    atomic renames (works on shared/network storage)
+
+A claimed job is leased to its worker for ``lease_seconds``. Workers extend
+the lease with heartbeats; a job whose lease expired (crashed or stuck
+worker) is delivered again to the next worker that claims, up to
+``max_attempts`` times. Each claim gets a new lease token, and heartbeats,
+completion and failure only succeed with the current token, so a worker that
+lost its lease cannot overwrite the newer attempt. Delivery is at least once.
+Lease expiry uses wall-clock time, so hosts sharing a queue need synchronized
+clocks.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+JOB_STATES = ("pending", "running", "done", "failed")
+
+# How long a directory-queue worker may take to move a job it has taken
+# ownership of (to finish it or requeue an expired lease) before other workers
+# consider it stale
+TAKEOVER_GRACE_SECONDS = 60.0
+
+
+@dataclass
+class Job:
+    """A job claimed by a worker."""
+
+    job_id: str
+    payload: dict
+    attempts: int
+    worker_id: str
+    lease_token: str
+
+
+def _new_job_id() -> str:
+    # Time-ordered so pending jobs are claimed roughly in enqueue order
+    return f"{time.time_ns():020d}_{uuid.uuid4().hex[:8]}"
+
+
+class JobQueue:
+    """
+    Base class for shared job queues.
+
+    Subclasses implement enqueue/claim/heartbeat/complete/fail/stats/result.
+    ``artifact_dir`` is the shared directory where a job writes its files
+    (e.g. illustrations).
+    """
+
+    def __init__(self, artifacts_root: str, max_attempts: int = 3):
+        self.artifacts_root = artifacts_root
+        self.max_attempts = max_attempts
+
+    def artifact_dir(self, job_id: str) -> str:
+        return os.path.join(self.artifacts_root, job_id)
+
+    def enqueue(self, payload: dict, job_id: Optional[str] = None) -> str:
+        """Add a job; enqueuing an existing job id is a no-op. Returns the id."""
+        raise NotImplementedError
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[Job]:
+        """Lease the oldest available job (pending or with an expired lease)."""
+        raise NotImplementedError
+
+    def heartbeat(self, job: Job, lease_seconds: float) -> bool:
+        """Extend the lease; False if the worker no longer holds it."""
+        raise NotImplementedError
+
+    def complete(self, job: Job, result: str) -> bool:
+        """Store the result and mark the job done; False if the lease was lost."""
+        raise NotImplementedError
+
+    def fail(self, job: Job, error: str) -> bool:
+        """Return the job to the queue, or mark it failed after max_attempts."""
+        raise NotImplementedError
+
+    def result(self, job_id: str) -> Optional[str]:
+        """Result of a finished job, if any."""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        """Number of jobs in each state."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class SqliteJobQueue(JobQueue):
+    """Job queue in a SQLite database; claims run in IMMEDIATE transactions."""
+
+    def __init__(self, path: str, max_attempts: int = 3):
+        super().__init__(f"{os.path.splitext(path)[0]}_artifacts", max_attempts)
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, payload TEXT NOT NULL, status TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, worker TEXT, lease_token TEXT, "
+            "lease_expires REAL, created_at REAL, updated_at REAL, "
+            "result TEXT, error TEXT)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)"
+        )
+
+    def enqueue(self, payload: dict, job_id: Optional[str] = None) -> str:
+        job_id = job_id or _new_job_id()
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO jobs (id, payload, status, created_at, "
+                "updated_at) VALUES (?, ?, 'pending', ?, ?)",
+                (job_id, json.dumps(payload), now, now),
+            )
+        return job_id
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[Job]:
+        now = time.time()
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Stale jobs that used up their attempts are given up
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', lease_token = NULL, "
+                    "error = COALESCE(error, 'lease expired'), updated_at = ? "
+                    "WHERE status = 'running' AND lease_expires < ? "
+                    "AND attempts >= ?",
+                    (now, now, self.max_attempts),
+                )
+                row = self._conn.execute(
+                    "SELECT id, payload, attempts FROM jobs "
+                    "WHERE status = 'pending' "
+                    "OR (status = 'running' AND lease_expires < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', "
+                        "attempts = attempts + 1, worker = ?, lease_token = ?, "
+                        "lease_expires = ?, updated_at = ? WHERE id = ?",
+                        (worker_id, token, now + lease_seconds, now, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job_id, payload, attempts = row
+        return Job(job_id, json.loads(payload), attempts + 1, worker_id, token)
+
+    def _update_leased(self, job: Job, assignments: str, params: tuple) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE jobs SET {assignments}, updated_at = ? "
+                "WHERE id = ? AND lease_token = ? AND status = 'running'",
+                (*params, time.time(), job.job_id, job.lease_token),
+            )
+        return cursor.rowcount == 1
+
+    def heartbeat(self, job: Job, lease_seconds: float) -> bool:
+        return self._update_leased(
+            job, "lease_expires = ?", (time.time() + lease_seconds,)
+        )
+
+    def complete(self, job: Job, result: str) -> bool:
+        return self._update_leased(
+            job,
+            "status = 'done', result = ?, error = NULL, lease_token = NULL",
+            (result,),
+        )
+
+    def fail(self, job: Job, error: str) -> bool:
+        status = "failed" if job.attempts >= self.max_attempts else "pending"
+        return self._update_leased(
+            job, "status = ?, error = ?, lease_token = NULL", (status, error)
+        )
+
+    def result(self, job_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall()
+        counts = dict.fromkeys(JOB_STATES, 0)
+        counts.update(dict(rows))
+        return counts
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class DirectoryJobQueue(JobQueue):
+    """
+    Job queue on a (shared) directory.
+
+    Layout: ``pending/``, ``done/`` and ``failed/`` hold one
+    ``<job_id>.json`` record per job. A claimed job's record is renamed to
+    ``running/<job_id>.<token>.lease``; the file's mtime is the lease expiry,
+    so heartbeats only touch it. The record is never rewritten in place:
+    whoever finishes or requeues a job first renames it to a name of its own
+    (``.fin`` or ``.reap``), so exactly one worker wins and stale workers fail
+    on the missing file. Results are written to ``results/<job_id>.json`` and
+    artifacts to ``artifacts/<job_id>/``.
+    """
+
+    RUNNING_KINDS = ("lease", "reap", "fin")
+
+    def __init__(self, root: str, max_attempts: int = 3):
+        super().__init__(os.path.join(root, "artifacts"), max_attempts)
+        self.root = root
+        for name in (*JOB_STATES, "results"):
+            os.makedirs(os.path.join(root, name), exist_ok=True)
+
+    def _path(self, state: str, job_id: str, ext: str = ".json") -> str:
+        return os.path.join(self.root, state, f"{job_id}{ext}")
+
+    def _running_path(self, job_id: str, token: str, kind: str) -> str:
+        return self._path("running", job_id, f".{token}.{kind}")
+
+    def _running_entries(self) -> List[Tuple[str, str]]:
+        """(file name, job id) of every job file in running/."""
+        entries = []
+        for name in os.listdir(os.path.join(self.root, "running")):
+            parts = name.rsplit(".", 2)
+            if len(parts) == 3 and parts[2] in self.RUNNING_KINDS:
+                entries.append((name, parts[0]))
+        return entries
+
+    @staticmethod
+    def _read(path: str) -> Optional[dict]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    @staticmethod
+    def _write(path: str, data) -> None:
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            if isinstance(data, str):
+                f.write(data)
+            else:
+                json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _set_expiry(path: str, expires: float) -> bool:
+        try:
+            os.utime(path, (expires, expires))
+            return True
+        except FileNotFoundError:
+            # Another worker renamed it first
+            return False
+
+    def _take(
+        self,
+        path: str,
+        job_id: str,
+        kind: str,
+        token: str,
+        expired_before: Optional[float] = None,
+    ) -> Optional[str]:
+        """
+        Atomically take ownership of a running job file.
+
+        Renames it to a name only this caller uses and pushes its expiry out
+        by TAKEOVER_GRACE_SECONDS. With ``expired_before``, a file whose lease
+        was renewed up to that time is handed back to its owner. Returns the
+        new path, or None if the file was taken by another worker or renewed.
+        """
+        owned = self._running_path(job_id, token, kind)
+        try:
+            os.rename(path, owned)
+            if expired_before is not None and os.path.getmtime(owned) >= expired_before:
+                # The owner renewed the lease just before we took it
+                os.rename(owned, path)
+                return None
+        except FileNotFoundError:
+            return None
+        # Until the expiry is pushed out, a reaper may still take it from us
+        if not self._set_expiry(owned, time.time() + TAKEOVER_GRACE_SECONDS):
+            return None
+        return owned
+
+    def enqueue(self, payload: dict, job_id: Optional[str] = None) -> str:
+        job_id = job_id or _new_job_id()
+        if any(os.path.exists(self._path(s, job_id)) for s in JOB_STATES) or any(
+            running_id == job_id for _, running_id in self._running_entries()
+        ):
+            return job_id
+        record = {
+            "id": job_id,
+            "payload": payload,
+            "attempts": 0,
+            "created_at": time.time(),
+            "error": None,
+        }
+        self._write(self._path("pending", job_id), record)
+        return job_id
+
+    def _requeue_expired(self) -> None:
+        """Move running jobs whose lease expired back to pending (or failed)."""
+        now = time.time()
+        for name, job_id in self._running_entries():
+            path = os.path.join(self.root, "running", name)
+            try:
+                if os.path.getmtime(path) >= now:
+                    continue
+            except FileNotFoundError:
+                continue
+            owned = self._take(
+                path, job_id, "reap", uuid.uuid4().hex, expired_before=now
+            )
+            if owned is None:
+                continue
+            record = self._read(owned)
+            # Skip jobs already moved on by a taker that crashed before cleanup
+            moved_on = any(os.path.exists(self._path(s, job_id)) for s in JOB_STATES)
+            if record is not None and not moved_on:
+                # The expired lease counts as an attempt
+                record["attempts"] += 1
+                record["error"] = record.get("error") or "lease expired"
+                target = (
+                    "failed" if record["attempts"] >= self.max_attempts else "pending"
+                )
+                self._write(self._path(target, job_id), record)
+                logger.warning("Lease of job %s expired; moved to %s", job_id, target)
+            os.remove(owned)
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[Job]:
+        self._requeue_expired()
+        for name in sorted(os.listdir(os.path.join(self.root, "pending"))):
+            if not name.endswith(".json"):
+                continue
+            job_id = name[: -len(".json")]
+            pending_path = self._path("pending", job_id)
+            token = uuid.uuid4().hex
+            lease_path = self._running_path(job_id, token, "lease")
+            # Set the expiry before the rename so the lease never looks expired
+            if not self._set_expiry(pending_path, time.time() + lease_seconds):
+                continue
+            try:
+                os.rename(pending_path, lease_path)
+            except FileNotFoundError:
+                # Another worker claimed it first
+                continue
+            if not self._set_expiry(lease_path, time.time() + lease_seconds):
+                continue
+            record = self._read(lease_path)
+            if record is None:
+                continue
+            return Job(
+                job_id, record["payload"], record["attempts"] + 1, worker_id, token
+            )
+        return None
+
+    def heartbeat(self, job: Job, lease_seconds: float) -> bool:
+        return self._set_expiry(
+            self._running_path(job.job_id, job.lease_token, "lease"),
+            time.time() + lease_seconds,
+        )
+
+    def _finish(
+        self,
+        job: Job,
+        target: str,
+        error: Optional[str] = None,
+        result: Optional[str] = None,
+    ) -> bool:
+        owned = self._take(
+            self._running_path(job.job_id, job.lease_token, "lease"),
+            job.job_id,
+            "fin",
+            job.lease_token,
+        )
+        if owned is None:
+            return False
+        record = self._read(owned)
+        record["attempts"] = job.attempts
+        record["error"] = error
+        if result is not None:
+            self._write(self._path("results", job.job_id), result)
+        self._write(self._path(target, job.job_id), record)
+        os.remove(owned)
+        return True
+
+    def complete(self, job: Job, result: str) -> bool:
+        return self._finish(job, "done", result=result)
+
+    def fail(self, job: Job, error: str) -> bool:
+        target = "failed" if job.attempts >= self.max_attempts else "pending"
+        return self._finish(job, target, error=error)
+
+    def result(self, job_id: str) -> Optional[str]:
+        try:
+            with open(self._path("results", job_id), "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def stats(self) -> Dict[str, int]:
+        counts = {
+            state: sum(
+                1
+                for name in os.listdir(os.path.join(self.root, state))
+                if name.endswith(".json")
+            )
+            for state in JOB_STATES
+        }
+        counts["running"] = len(self._running_entries())
+        return counts
+
+
+SQLITE_SUFFIXES = (".sqlite", ".sqlite3", ".db")
+
+
+def get_job_queue(location: str, max_attempts: int = 3) -> JobQueue:
+    """
+    Open the job queue at ``location``.
+
+    Paths ending in .sqlite, .sqlite3 or .db are SQLite queues; anything else
+    is a directory queue.
+    """
+    if location.endswith(SQLITE_SUFFIXES):
+        return SqliteJobQueue(location, max_attempts=max_attempts)
+    return DirectoryJobQueue(location, max_attempts=max_attempts)
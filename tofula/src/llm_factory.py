@@ -9,17 +9,47 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_huggingface import ChatHuggingFace, HuggingFaceEndpoint
 
 from tofula.src.config import MODEL_CONFIGS
+from tofula.src.deadline import request_timeout
 from tofula.src.prompt_loader import load_prompt
 
 logger = logging.getLogger(__name__)
 
 
+def _with_stage_timeout(kwargs: dict) -> dict:
+    """Add the current stage's remaining budget as the request timeout."""
+    timeout = request_timeout()
+    if timeout is not None:
+        kwargs.setdefault("timeout", timeout)
+    return kwargs
+
+
+class StageTimeoutChatGoogle(ChatGoogleGenerativeAI):
+    """
+    Gemini chat model whose requests time out with the current stage budget.
+
+    Deadline stages run on worker threads that are abandoned, not cancelled,
+    when the budget is spent; the request timeout makes the call itself stop.
+    """
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return super()._generate(
+            messages, stop=stop, run_manager=run_manager, **_with_stage_timeout(kwargs)
+        )
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        return super()._stream(
+            messages, stop=stop, run_manager=run_manager, **_with_stage_timeout(kwargs)
+        )
+
+
 def get_chat_llm(model: str, temperature: float):
     """
     Factory for chat LLMs used by the story pipeline.
 
     Decides which provider to use based on MODEL_CONFIGS and returns
-    an initialized LangChain chat model.
+    an initialized LangChain chat model. Gemini requests made inside a
+    deadline stage time out with the stage's remaining budget; Hugging Face
+    requests only have the endpoint's own timeout.
     """
     if model not in MODEL_CONFIGS:
         raise ValueError(
@@ -31,7 +61,7 @@ def get_chat_llm(model: str, temperature: float):
     logger.info("Setting up %s model: %s", provider, model)
 
     if provider == "google":
-        return ChatGoogleGenerativeAI(
+        return StageTimeoutChatGoogle(
             model=model,
             temperature=temperature,
             google_api_key=os.getenv("GOOGLE_API_KEY"),
@@ -0,0 +1,383 @@
+"""
+Per-page narration (text-to-speech) for generated stories.
+
+The final story text is split into one segment per page. Pages are synthesized
+concurrently (bounded by ``max_concurrency``) through a pluggable TTSBackend,
+cached on disk by a hash of backend, voice and text, and concatenated into one
+WAV file for the whole story. ``stream_narration`` yields the page segments in
+reading order as soon as each one is ready, so playback can start before the
+last page is synthesized.
+
+Backends:
+  - OfflineTTSBackend: local, deterministic placeholder audio (no network)
+  - GeminiTTSBackend: Gemini speech generation through google-genai
+"""
+
+import array
+import hashlib
+import io
+import logging
+import math
+import os
+import re
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from tofula.src import tracing
+from tofula.src.config import MODEL_CONFIGS
+
+logger = logging.getLogger(__name__)
+
+# All backends return 16-bit mono PCM at this rate so segments can be joined
+SAMPLE_RATE = 24000
+SAMPLE_WIDTH = 2
+CHANNELS = 1
+
+
+def pcm_to_wav(pcm: bytes, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """Wrap raw 16-bit mono PCM in a WAV container."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(CHANNELS)
+        wav.setsampwidth(SAMPLE_WIDTH)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def concatenate_wav(paths: List[str], output_path: str) -> str:
+    """Join WAV files with identical formats into ``output_path``."""
+    params = None
+    with wave.open(output_path, "wb") as out:
+        for path in paths:
+            with wave.open(path, "rb") as segment:
+                if params is None:
+                    params = segment.getparams()
+                    out.setparams(params)
+                elif segment.getparams()[:3] != params[:3]:
+                    raise ValueError(f"Audio format of {path} does not match")
+                out.writeframes(segment.readframes(segment.getnframes()))
+    return output_path
+
+
+# --- Backends -------------------------------------------------------------
+
+
+class TTSBackend:
+    """
+    Interface for speech synthesis backends.
+
+    Subclasses implement ``synthesize`` and return a WAV file (16-bit mono,
+    SAMPLE_RATE Hz) as bytes. Backends must be safe to call from several
+    threads at once. ``remote`` backends call a network service; recording
+    cassettes capture their calls and replay serves them back.
+    """
+
+    name = "base"
+    remote = True
+
+    def synthesize(self, text: str, voice: str) -> bytes:
+        raise NotImplementedError
+
+
+class OfflineTTSBackend(TTSBackend):
+    """
+    Local stand-in for a speech engine, for tests and offline runs.
+
+    Produces a quiet tone whose length follows the word count of the text.
+    ``latency`` simulates the per-call time of a remote engine.
+    """
+
+    name = "offline"
+    remote = False
+
+    def __init__(self, seconds_per_word: float = 0.3, latency: float = 0.0):
+        self.seconds_per_word = seconds_per_word
+        self.latency = latency
+
+    def synthesize(self, text: str, voice: str) -> bytes:
+        if self.latency:
+            time.sleep(self.latency)
+        # Pitch depends on the voice so different voices are distinguishable
+        frequency = 200 + int(hashlib.sha256(voice.encode()).hexdigest(), 16) % 400
+        period = array.array(
+            "h",
+            (
+                int(2000 * math.sin(2 * math.pi * frequency * i / SAMPLE_RATE))
+                for i in range(SAMPLE_RATE // frequency)
+            ),
+        )
+        num_samples = int(len(text.split()) * self.seconds_per_word * SAMPLE_RATE)
+        samples = period * (num_samples // len(period) + 1)
+        return pcm_to_wav(samples[:num_samples].tobytes())
+
+
+class GeminiTTSBackend(TTSBackend):
+    """Speech generation with a Gemini TTS model (prebuilt voices)."""
+
+    name = "gemini"
+
+    def __init__(self, model: str = "gemini-2.5-flash-preview-tts"):
+        if model not in MODEL_CONFIGS:
+            raise ValueError(
+                f"Model {model} not supported. "
+                f"Available models: {list(MODEL_CONFIGS.keys())}"
+            )
+        provider = MODEL_CONFIGS[model]["provider"]
+        if provider != "google-tts":
+            raise ValueError(
+                f"Model {model} is not configured as a TTS model (provider={provider})."
+            )
+        api_key = os.getenv("GOOGLE_API_KEY")
+        if not api_key:
+            raise RuntimeError("GOOGLE_API_KEY is required for narration.")
+
+        from google import genai
+
+        logger.info("Setting up Google TTS model: %s", model)
+        self.client = genai.Client(api_key=api_key)
+        self.model = model
+
+    def synthesize(self, text: str, voice: str) -> bytes:
+        from google.genai import types as genai_types
+
+        response = self.client.models.generate_content(
+            model=self.model,
+            contents=text,
+            config=genai_types.GenerateContentConfig(
+                response_modalities=[genai_types.Modality.AUDIO],
+                speech_config=genai_types.SpeechConfig(
+                    voice_config=genai_types.VoiceConfig(
+                        prebuilt_voice_config=genai_types.PrebuiltVoiceConfig(
+                            voice_name=voice
+                        )
+                    )
+                ),
+            ),
+        )
+        for candidate in response.candidates or []:
+            if candidate.content and candidate.content.parts:
+                for part in candidate.content.parts:
+                    inline = getattr(part, "inline_data", None)
+                    if inline and getattr(inline, "data", None):
+                        # Gemini returns raw 24 kHz 16-bit mono PCM
+                        return pcm_to_wav(inline.data)
+        raise RuntimeError("No audio returned from Gemini TTS model")
+
+
+TTS_BACKENDS = {
+    "offline": OfflineTTSBackend,
+    "gemini": GeminiTTSBackend,
+}
+
+DEFAULT_VOICES = {
+    "offline": "default",
+    "gemini": "Kore",
+}
+
+
+def get_tts_backend(kind: str, **kwargs) -> TTSBackend:
+    """Create a TTS backend by name ('offline' or 'gemini')."""
+    if kind not in TTS_BACKENDS:
+        raise ValueError(
+            f"TTS backend {kind} not supported. "
+            f"Available backends: {list(TTS_BACKENDS.keys())}"
+        )
+    return TTS_BACKENDS[kind](**kwargs)
+
+
+# --- Cache ----------------------------------------------------------------
+
+
+class AudioCache:
+    """
+    On-disk cache of synthesized segments keyed by backend, voice and text.
+
+    Writes are atomic, so several threads or processes can share a directory.
+    """
+
+    def __init__(self, directory: str = os.path.join("temp", "audio_cache")):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(backend: str, voice: str, text: str) -> str:
+        return hashlib.sha256(f"{backend}\0{voice}\0{text}".encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.wav")
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key: str, audio: bytes) -> None:
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(audio)
+        os.replace(tmp_path, path)
+
+
+# --- Narration ------------------------------------------------------------
+
+_PAGE_MARKER = re.compile(r"^\s*\**page\s+\d+\**\s*[:.\-]?\s*", re.IGNORECASE)
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def _balanced_groups(units: List[str], num_groups: int) -> List[str]:
+    """Join consecutive units into num_groups chunks of similar length."""
+    total = sum(len(u) for u in units)
+    groups: List[List[str]] = [[]]
+    consumed = 0
+    for index, unit in enumerate(units):
+        units_left = len(units) - index
+        groups_left = num_groups - len(groups)
+        target = total * len(groups) / num_groups
+        if (
+            groups[-1]
+            and groups_left
+            and (consumed >= target or units_left <= groups_left)
+        ):
+            groups.append([])
+        groups[-1].append(unit)
+        consumed += len(unit)
+    return [" ".join(group) if group else "" for group in groups]
+
+
+def split_story_pages(story_text: str, num_pages: int) -> List[str]:
+    """
+    Split the final story into ``num_pages`` narration segments.
+
+    Paragraphs are kept together where possible; "Page N:" markers are
+    dropped. Stories with fewer paragraphs than pages are split by sentence.
+    """
+    paragraphs = []
+    for block in re.split(r"\n\s*\n", story_text):
+        block = _PAGE_MARKER.sub("", block.strip()).strip()
+        if block:
+            paragraphs.append(" ".join(block.split()))
+    if num_pages <= 0 or not paragraphs:
+        return []
+
+    units = paragraphs
+    if len(units) < num_pages:
+        units = [s for p in paragraphs for s in _SENTENCE_END.split(p) if s]
+    if len(units) <= num_pages:
+        return units + [""] * (num_pages - len(units))
+    return _balanced_groups(units, num_pages)
+
+
+def stream_narration(
+    pages: Dict[int, str],
+    backend: TTSBackend,
+    voice: str,
+    output_dir: str,
+    cache: Optional[AudioCache] = None,
+    max_concurrency: int = 4,
+    stats: Optional[dict] = None,
+) -> Iterator[Tuple[int, str]]:
+    """
+    Synthesize pages concurrently and yield (page, wav_path) in page order.
+
+    At most ``max_concurrency`` synthesis calls run at once. Each page is
+    yielded as soon as it and all pages before it are ready. Empty pages are
+    skipped. If ``stats`` is given, it is updated with synthesis and cache
+    hit counts.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if stats is not None:
+        stats.update({"synthesized": 0, "cache_hits": 0})
+    lock = threading.Lock()
+
+    def _narrate_page(page: int, text: str) -> str:
+        with tracing.span("tts_page", "tts", page=page):
+            key = AudioCache.key(backend.name, voice, text)
+            audio = cache.get(key) if cache else None
+            counter = "cache_hits"
+            if audio is None:
+                audio = backend.synthesize(text, voice)
+                counter = "synthesized"
+                if cache:
+                    cache.put(key, audio)
+            if stats is not None:
+                with lock:
+                    stats[counter] += 1
+            path = os.path.join(output_dir, f"narration_page_{page}.wav")
+            with open(path, "wb") as f:
+                f.write(audio)
+            return path
+
+    ordered = [(page, text) for page, text in sorted(pages.items()) if text.strip()]
+    executor = ThreadPoolExecutor(
+        max_workers=max(max_concurrency, 1), thread_name_prefix="tofula-tts"
+    )
+    try:
+        futures = [
+            (page, executor.submit(tracing.propagate(_narrate_page), page, text))
+            for page, text in ordered
+        ]
+        for page, future in futures:
+            yield page, future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def narrate_story(
+    pages: Dict[int, str],
+    backend: TTSBackend,
+    voice: str,
+    output_dir: str,
+    cache: Optional[AudioCache] = None,
+    max_concurrency: int = 4,
+) -> Tuple[Optional[str], dict]:
+    """
+    Narrate all pages and concatenate them into ``story_narration.wav``.
+
+    Returns the path of the full narration (None if there was no text) and
+    stats with the per-page segment paths, synthesis/cache counts and time.
+    """
+    start = time.perf_counter()
+    stats: dict = {}
+    segments = dict(
+        stream_narration(
+            pages,
+            backend,
+            voice,
+            output_dir,
+            cache=cache,
+            max_concurrency=max_concurrency,
+            stats=stats,
+        )
+    )
+    full_path = None
+    if segments:
+        full_path = concatenate_wav(
+            [segments[page] for page in sorted(segments)],
+            os.path.join(output_dir, "story_narration.wav"),
+        )
+    stats.update(
+        {
+            "backend": backend.name,
+            "voice": voice,
+            "pages": {page: f"audio://{path}" for page, path in segments.items()},
+            "max_concurrency": max_concurrency,
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+    )
+    return full_path, stats
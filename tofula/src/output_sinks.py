@@ -0,0 +1,233 @@
+"""
+Output sinks that persist generated stories as soon as they are finished.
+
+Batch runs write each StoryOutput to a sink instead of keeping every result in
+memory until the end. Sinks buffer at most ``max_buffered`` serialized results
+before flushing them to their backing store:
+  - JsonlSink: one JSON document per line in a single file
+  - SqliteSink: one row per story in a SQLite table
+  - DirectorySink: one <story_id>.json file per story
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional, Set, Tuple
+
+from tofula.src import tracing
+from tofula.src.structures import StoryOutput
+
+logger = logging.getLogger(__name__)
+
+
+class OutputSink:
+    """
+    Base class for story output sinks.
+
+    Stories are serialized with pydantic's compiled JSON serializer as soon as
+    they are written, so the buffer only holds encoded strings. Subclasses
+    implement ``_write_batch`` to persist a list of (story_id, title, payload)
+    records. If a flush fails, the records stay buffered and the next flush
+    (or ``close``) retries them.
+    """
+
+    def __init__(self, max_buffered: int = 1, drop_draft: bool = False):
+        if max_buffered < 1:
+            raise ValueError("max_buffered must be at least 1")
+        self.max_buffered = max_buffered
+        self.drop_draft = drop_draft
+        self.written = 0
+        self._buffer: List[Tuple[str, str, str]] = []
+        self._ids: Set[str] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """Number of buffered stories not persisted yet."""
+        return len(self._buffer)
+
+    def serialize(self, story: StoryOutput) -> str:
+        """Encode a story as JSON, dropping the intermediate draft if configured."""
+        exclude = {"draft"} if self.drop_draft else None
+        return story.model_dump_json(exclude=exclude)
+
+    def write(self, story: StoryOutput, story_id: Optional[str] = None) -> str:
+        """
+        Serialize and buffer a story, flushing once the buffer is full.
+
+        Raises ValueError (without buffering the story) if the id was already
+        written to this sink. Returns the id under which the story is stored.
+        """
+        story_id = story_id or uuid.uuid4().hex
+        payload = self.serialize(story)
+        with self._lock:
+            if story_id in self._ids or self._exists(story_id):
+                raise ValueError(
+                    f"Story {story_id} already exists in {type(self).__name__}"
+                )
+            self._ids.add(story_id)
+            self._buffer.append((story_id, story.title, payload))
+            if len(self._buffer) >= self.max_buffered:
+                self._flush_locked()
+        return story_id
+
+    def flush(self) -> None:
+        """Persist all buffered stories."""
+        with self._lock:
+            self._flush_locked()
+
+    def close(self) -> None:
+        """Flush remaining stories and release resources."""
+        self.flush()
+
+    def _flush_locked(self) -> None:
+        if not self._buffer:
+            return
+        batch = list(self._buffer)
+        with tracing.span(
+            "sink_flush", "io", sink=type(self).__name__, size=len(batch)
+        ):
+            self._write_batch(batch)
+        # Only drop the records once they are persisted
+        del self._buffer[: len(batch)]
+        self.written += len(batch)
+        logger.debug("Flushed %s stories to %s", len(batch), type(self).__name__)
+
+    def _exists(self, story_id: str) -> bool:
+        """Whether the backing store already holds ``story_id``."""
+        return False
+
+    def _write_batch(self, records: List[Tuple[str, str, str]]) -> None:
+        raise NotImplementedError
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class JsonlSink(OutputSink):
+    """Append each story as one line of ``{"id": ..., "story": {...}}`` JSON."""
+
+    def __init__(self, path: str, max_buffered: int = 1, drop_draft: bool = False):
+        super().__init__(max_buffered=max_buffered, drop_draft=drop_draft)
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _write_batch(self, records: List[Tuple[str, str, str]]) -> None:
+        lines = [
+            f'{{"id": {json.dumps(story_id)}, "story": {payload}}}\n'
+            for story_id, _, payload in records
+        ]
+        self._file.writelines(lines)
+        self._file.flush()
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            self._file.close()
+
+
+class SqliteSink(OutputSink):
+    """Store each story as a row in a SQLite table."""
+
+    def __init__(
+        self,
+        path: str,
+        table: str = "stories",
+        max_buffered: int = 1,
+        drop_draft: bool = False,
+    ):
+        super().__init__(max_buffered=max_buffered, drop_draft=drop_draft)
+        if not table.isidentifier():
+            raise ValueError(f"Invalid table name: {table}")
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.path = path
+        self.table = table
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "id TEXT PRIMARY KEY, title TEXT, created_at TEXT, payload TEXT)"
+        )
+        self._conn.commit()
+
+    def _exists(self, story_id: str) -> bool:
+        row = self._conn.execute(
+            f"SELECT 1 FROM {self.table} WHERE id = ?", (story_id,)
+        ).fetchone()
+        return row is not None
+
+    def _write_batch(self, records: List[Tuple[str, str, str]]) -> None:
+        created_at = datetime.now(timezone.utc).isoformat()
+        # One transaction, rolled back on error so a retry starts clean
+        with self._conn:
+            self._conn.executemany(
+                f"INSERT INTO {self.table} "
+                "(id, title, created_at, payload) VALUES (?, ?, ?, ?)",
+                [
+                    (story_id, title, created_at, payload)
+                    for story_id, title, payload in records
+                ],
+            )
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            self._conn.close()
+
+
+class DirectorySink(OutputSink):
+    """Write each story to ``<directory>/<story_id>.json``."""
+
+    def __init__(self, directory: str, max_buffered: int = 1, drop_draft: bool = False):
+        super().__init__(max_buffered=max_buffered, drop_draft=drop_draft)
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+    def _exists(self, story_id: str) -> bool:
+        return os.path.exists(os.path.join(self.directory, f"{story_id}.json"))
+
+    def _write_batch(self, records: List[Tuple[str, str, str]]) -> None:
+        for story_id, _, payload in records:
+            path = os.path.join(self.directory, f"{story_id}.json")
+            # Write to a temp file first so readers never see partial stories
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+
+
+SINK_TYPES = {
+    "jsonl": JsonlSink,
+    "sqlite": SqliteSink,
+    "dir": DirectorySink,
+}
+
+
+def get_output_sink(
+    kind: str, path: str, max_buffered: int = 1, drop_draft: bool = False
+) -> OutputSink:
+    """
+    Factory for output sinks.
+
+    ``kind`` is one of SINK_TYPES; ``path`` is the file (jsonl, sqlite) or
+    directory (dir) the sink writes to.
+    """
+    if kind not in SINK_TYPES:
+        raise ValueError(
+            f"Sink {kind} not supported. Available sinks: {list(SINK_TYPES.keys())}"
+        )
+    return SINK_TYPES[kind](path, max_buffered=max_buffered, drop_draft=drop_draft)
@@ -1,7 +1,143 @@
+"""
+PDF export for generated stories.
+
+Exports can optionally share a PdfRenderCache. It keeps encoded image XObjects
+keyed by a hash of the image bytes, plus the rendered content stream of the
+cover and of each page keyed by a hash of everything the page draws. Re-exporting
+after one page changed only re-renders that page. The cache hooks into
+ReportLab canvas internals (content stream, XObject and font registration), so
+exports without a cache use plain ReportLab calls only. If those internals do
+not behave as expected, the cache disables itself and the export falls back to
+a plain render.
+"""
+
+import copy
+import hashlib
+import json
 import os
 import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from tofula.src import tracing
+from tofula.src.structures import StoryOutput, StoryBeat
+
+# Bump when the page layout changes so cached fragments are not reused
+LAYOUT_VERSION = 1
+
+# Fonts used by the layout, registered in a fixed order so cached content
+# streams refer to the same internal font names in every export
+LAYOUT_FONTS = ("Helvetica-Bold", "Helvetica")
+
+# Canvas and document internals the cache relies on
+_CANVAS_INTERNALS = ("_code", "_formsinuse", "_currentPageHasImages")
+_DOC_INTERNALS = ("idToObject", "getXObjectName", "Reference", "addForm")
+
+
+class _CacheMismatch(Exception):
+    """ReportLab internals differ from what the render cache expects."""
+
+
+@dataclass
+class PageFragment:
+    """Rendered content stream of one PDF page."""
+
+    ops: List[str]
+    # (form name, image key) pairs of image XObjects the page draws
+    images: List[Tuple[str, str]] = field(default_factory=list)
+
+
+class PdfRenderCache:
+    """
+    Cache of rendered PDF pieces shared across exports.
+
+    Keep one instance per editing session (or per process) and pass it to
+    every save_story_to_pdf call. The cache is thread-safe, so concurrent
+    exports may share it.
+    """
+
+    def __init__(self, max_images: int = 256, max_pages: int = 2048):
+        self.max_images = max_images
+        self.max_pages = max_pages
+        self._images: "OrderedDict[str, object]" = OrderedDict()
+        self._pages: "OrderedDict[str, PageFragment]" = OrderedDict()
+        # Cleared when ReportLab does not behave as the cache expects
+        self.enabled = True
+        self._lock = threading.Lock()
+        self.stats = {
+            "page_hits": 0,
+            "page_misses": 0,
+            "image_hits": 0,
+            "image_misses": 0,
+        }
 
-from tofula.src.structures import StoryOutput
+    @staticmethod
+    def _lru_get(store: OrderedDict, key: str):
+        value = store.get(key)
+        if value is not None:
+            store.move_to_end(key)
+        return value
+
+    @staticmethod
+    def _lru_put(store: OrderedDict, key: str, value, limit: int) -> None:
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > limit:
+            store.popitem(last=False)
+
+    def image_xobject(self, image_key: str, img_path: Optional[str] = None):
+        """
+        Return a fresh XObject for an image, encoding the file only once.
+
+        The cached template is never registered with a document itself;
+        every export gets a shallow copy sharing the encoded stream.
+        Returns None if the image is not cached and no path is given.
+        """
+        from reportlab.pdfbase.pdfdoc import PDFImageXObject
+
+        with self._lock:
+            template = self._lru_get(self._images, image_key)
+            if template is not None:
+                self.stats["image_hits"] += 1
+                return copy.copy(template)
+            if img_path is None:
+                return None
+            self.stats["image_misses"] += 1
+        # Encode outside the lock; a concurrent miss for the same image only
+        # costs a duplicate encode
+        template = PDFImageXObject(image_key, img_path)
+        with self._lock:
+            self._lru_put(self._images, image_key, template, self.max_images)
+        return copy.copy(template)
+
+    def get_page(self, key: str) -> Optional[Tuple[PageFragment, list]]:
+        """
+        Return a cached page and fresh XObjects for the images it draws.
+
+        Both are taken under one lock, so the images cannot be evicted by a
+        concurrent export in between.
+        """
+        with self._lock:
+            fragment = self._lru_get(self._pages, key)
+            # A fragment is only usable while the images it draws are still cached
+            if fragment is not None and all(
+                image_key in self._images for _, image_key in fragment.images
+            ):
+                self.stats["page_hits"] += 1
+                self.stats["image_hits"] += len(fragment.images)
+                xobjects = [
+                    copy.copy(self._lru_get(self._images, image_key))
+                    for _, image_key in fragment.images
+                ]
+                return fragment, xobjects
+            self.stats["page_misses"] += 1
+            return None
+
+    def put_page(self, key: str, fragment: PageFragment) -> None:
+        with self._lock:
+            self._lru_put(self._pages, key, fragment, self.max_pages)
 
 
 def _wrap_text(
@@ -35,7 +171,215 @@ def _wrap_text(
     return lines
 
 
-def save_story_to_pdf(story: StoryOutput, pdf_path: str) -> None:
+def _resolve_image_path(story: StoryOutput, page: int) -> Optional[str]:
+    """Return the on-disk illustration path for a page, if it exists."""
+    if story.illustrations and page in story.illustrations:
+        uri = story.illustrations[page]
+        if isinstance(uri, str):
+            # Support "image://..." URIs or plain paths
+            if uri.startswith("image://"):
+                candidate = uri[len("image://") :]
+            else:
+                candidate = uri
+            if os.path.exists(candidate):
+                return candidate
+    return None
+
+
+def _file_digest(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _fragment_key(*parts) -> str:
+    encoded = json.dumps([LAYOUT_VERSION, *parts], sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _cover_lines(story: StoryOutput) -> list[str]:
+    meta_lines = []
+    if "theme" in story.metadata:
+        meta_lines.append(f"Theme: {story.metadata['theme']}")
+    if "tone" in story.metadata:
+        meta_lines.append(f"Tone: {story.metadata['tone']}")
+    if "reading_level" in story.metadata:
+        meta_lines.append(f"Reading level: {story.metadata['reading_level']}")
+    if "length" in story.metadata:
+        meta_lines.append(f"Pages (target): {story.metadata['length']}")
+    return meta_lines
+
+
+def _draw_cover(c, title: str, meta_lines: list[str], height: float, margin: float):
+    from reportlab.lib.units import inch
+
+    c.setFont("Helvetica-Bold", 22)
+    y = height - margin - 0.5 * inch
+    c.drawString(margin, y, title)
+
+    c.setFont("Helvetica", 12)
+    y -= 0.5 * inch
+    for line in meta_lines:
+        c.drawString(margin, y, line)
+        y -= 0.25 * inch
+
+
+def _register_cached_image(
+    c, img_path: str, image_key: str, cache: PdfRenderCache
+) -> str:
+    """
+    Register the cached XObject for an image under the name drawImage uses
+    for ``img_path``, so drawImage reuses it instead of decoding the file.
+
+    Returns the form name.
+    """
+    try:
+        from reportlab.lib.utils import _digester
+    except ImportError as exc:
+        raise _CacheMismatch(str(exc)) from exc
+
+    form_name = _digester(f"{img_path}None".encode("utf-8"))
+    _register_form(c, form_name, cache.image_xobject(image_key, img_path))
+    return form_name
+
+
+def _register_form(c, form_name: str, img_obj) -> None:
+    reg_name = c._doc.getXObjectName(form_name)
+    if c._doc.idToObject.get(reg_name) is None:
+        c._doc.Reference(img_obj, reg_name)
+        c._doc.addForm(form_name, img_obj)
+
+
+def _draw_story_page(
+    c,
+    beat: StoryBeat,
+    img_path: Optional[str],
+    width: float,
+    height: float,
+    margin: float,
+    image_key: Optional[str] = None,
+    cache: Optional[PdfRenderCache] = None,
+) -> List[Tuple[str, str]]:
+    """
+    Draw one story page (without showPage).
+
+    Returns the (form name, image key) pairs of cached images drawn.
+    """
+    from reportlab.lib.units import inch
+
+    c.setFont("Helvetica-Bold", 16)
+    y = height - margin
+    c.drawString(margin, y, f"Page {beat.page}")
+
+    # Storyline / summary (wrapped to page width)
+    y -= 0.4 * inch
+    font_name = "Helvetica"
+    font_size = 12
+    c.setFont(font_name, font_size)
+    max_text_width = width - 2 * margin
+    wrapped_lines = _wrap_text(
+        beat.summary,
+        canvas_obj=c,
+        max_width=max_text_width,
+        font_name=font_name,
+        font_size=font_size,
+    )
+    text_obj = c.beginText(margin, y)
+    for line in wrapped_lines:
+        text_obj.textLine(line)
+    c.drawText(text_obj)
+
+    # Reserve some space at bottom for image / prompt
+    available_height_for_image = height * 0.8
+    image_bottom = margin
+    drawn_images: List[Tuple[str, str]] = []
+
+    if img_path:
+        img_width = width - 2 * margin
+        img_height = available_height_for_image
+        try:
+            if cache is not None and image_key:
+                form_name = _register_cached_image(c, img_path, image_key, cache)
+                drawn_images.append((form_name, image_key))
+            c.drawImage(
+                img_path,
+                margin,
+                image_bottom,
+                width=img_width,
+                height=img_height,
+                preserveAspectRatio=True,
+                anchor="sw",
+            )
+            # drawImage must have picked up the cached XObject
+            if drawn_images and c._formsinuse[-1:] != [drawn_images[-1][0]]:
+                raise _CacheMismatch(
+                    f"drawImage did not use the cached image name {form_name}"
+                )
+        except _CacheMismatch:
+            raise
+        except Exception as img_err:
+            # Fallback to prompt text if image fails
+            logging.warning(
+                "Failed to draw image for page %s (%s): %s",
+                beat.page,
+                img_path,
+                img_err,
+            )
+            img_path = None
+            drawn_images = []
+
+    if not img_path:
+        # Log the problem and draw a big red flag placeholder instead of the image
+        logging.warning(
+            "Could not find illustration image on disk for page %s. "
+            "Rendering a red missing-image flag in the PDF instead.",
+            beat.page,
+        )
+
+        # Draw red rectangle in the image area
+        c.setFillColorRGB(1, 0, 0)  # red
+        c.rect(
+            margin,
+            image_bottom,
+            width - 2 * margin,
+            available_height_for_image,
+            fill=1,
+            stroke=0,
+        )
+
+        # Draw warning text on top of the rectangle
+        c.setFillColorRGB(1, 1, 1)  # white text
+        c.setFont("Helvetica-Bold", 18)
+        text_y = image_bottom + available_height_for_image / 2
+        c.drawCentredString(
+            width / 2,
+            text_y,
+            "ILLUSTRATION MISSING",
+        )
+
+        # Reset fill color back to black for subsequent content
+        c.setFillColorRGB(0, 0, 0)
+
+    return drawn_images
+
+
+def _replay_fragment(c, fragment: PageFragment, xobjects: list) -> None:
+    """Append a cached page's content stream and register its images."""
+    for (form_name, _), img_obj in zip(fragment.images, xobjects):
+        _register_form(c, form_name, img_obj)
+        c._formsinuse.append(form_name)
+        c._currentPageHasImages = 1
+    c._code.extend(fragment.ops)
+
+
+def _canvas_supports_cache(c) -> bool:
+    return all(hasattr(c, name) for name in _CANVAS_INTERNALS) and all(
+        hasattr(c._doc, name) for name in _DOC_INTERNALS
+    )
+
+
+def save_story_to_pdf(
+    story: StoryOutput, pdf_path: str, cache: Optional[PdfRenderCache] = None
+) -> None:
     """
     Save the story as a PDF, visualizing each page's storyline with its illustration.
 
@@ -44,6 +388,9 @@ def save_story_to_pdf(story: StoryOutput, pdf_path: str) -> None:
         - Page number and summary text.
         - If an illustration image exists on disk, it is embedded.
         - Otherwise, the illustration prompt text is shown.
+
+    With a cache, only the cover and pages whose text or image changed since
+    an earlier export are rendered again; images are encoded once per content.
     """
 
     try:
@@ -57,128 +404,86 @@ def save_story_to_pdf(story: StoryOutput, pdf_path: str) -> None:
         ) from exc
 
     c = canvas.Canvas(pdf_path, pagesize=letter)
-    width, height = letter
-    margin = 0.75 * inch
+    if cache is not None and cache.enabled and not _canvas_supports_cache(c):
+        logging.warning(
+            "PDF render cache disabled: unsupported ReportLab canvas internals"
+        )
+        cache.enabled = False
+    if cache is not None and not cache.enabled:
+        cache = None
 
-    # Cover page
-    c.setFont("Helvetica-Bold", 22)
-    y = height - margin - 0.5 * inch
-    c.drawString(margin, y, story.title)
+    try:
+        _render_story(c, story, letter, 0.75 * inch, cache)
+    except _CacheMismatch as e:
+        logging.warning("PDF render cache disabled: %s", e)
+        cache.enabled = False
+        save_story_to_pdf(story, pdf_path)
+        return
 
-    c.setFont("Helvetica", 12)
-    y -= 0.5 * inch
-    meta_lines = []
-    if "theme" in story.metadata:
-        meta_lines.append(f"Theme: {story.metadata['theme']}")
-    if "tone" in story.metadata:
-        meta_lines.append(f"Tone: {story.metadata['tone']}")
-    if "reading_level" in story.metadata:
-        meta_lines.append(f"Reading level: {story.metadata['reading_level']}")
-    if "length" in story.metadata:
-        meta_lines.append(f"Pages (target): {story.metadata['length']}")
+    with tracing.span("pdf_save", "io", path=pdf_path):
+        c.save()
+    if cache is not None:
+        logging.info("PDF render cache stats: %s", cache.stats)
 
-    for line in meta_lines:
-        c.drawString(margin, y, line)
-        y -= 0.25 * inch
 
-    c.showPage()
+def _render_story(
+    c, story: StoryOutput, pagesize, margin: float, cache: Optional[PdfRenderCache]
+) -> None:
+    """Draw the cover and every story page onto the canvas."""
+    width, height = pagesize
+
+    if cache is not None:
+        for font in LAYOUT_FONTS:
+            c._doc.getInternalFontName(font)
+
+    # Cover page
+    meta_lines = _cover_lines(story)
+    with tracing.span("pdf_page", "pdf", page="cover"):
+        if cache is None:
+            _draw_cover(c, story.title, meta_lines, height, margin)
+        else:
+            key = _fragment_key("cover", story.title, meta_lines, pagesize)
+            cached = cache.get_page(key)
+            if cached is not None:
+                _replay_fragment(c, *cached)
+            else:
+                start = len(c._code)
+                _draw_cover(c, story.title, meta_lines, height, margin)
+                cache.put_page(key, PageFragment(ops=c._code[start:]))
+
+        c.showPage()
 
     # Page-by-page content
     for beat in story.outline.beats:
-        c.setFont("Helvetica-Bold", 16)
-        y = height - margin
-        c.drawString(margin, y, f"Page {beat.page}")
-
-        # Storyline / summary (wrapped to page width)
-        y -= 0.4 * inch
-        font_name = "Helvetica"
-        font_size = 12
-        c.setFont(font_name, font_size)
-        max_text_width = width - 2 * margin
-        wrapped_lines = _wrap_text(
-            beat.summary,
-            canvas_obj=c,
-            max_width=max_text_width,
-            font_name=font_name,
-            font_size=font_size,
-        )
-        text_obj = c.beginText(margin, y)
-        for line in wrapped_lines:
-            text_obj.textLine(line)
-        c.drawText(text_obj)
-
-        # Illustration: try to embed image if file exists, otherwise show prompt
-        img_path = None
-        if story.illustrations and beat.page in story.illustrations:
-            uri = story.illustrations[beat.page]
-            if isinstance(uri, str):
-                # Support "image://..." URIs or plain paths
-                if uri.startswith("image://"):
-                    candidate = uri[len("image://") :]
-                else:
-                    candidate = uri
-                if os.path.exists(candidate):
-                    img_path = candidate
-
-        # Reserve some space at bottom for image / prompt
-        available_height_for_image = height * 0.8
-        image_bottom = margin
-
-        if img_path:
-            img_width = width - 2 * margin
-            img_height = available_height_for_image
-            try:
-                c.drawImage(
+        with tracing.span("pdf_page", "pdf", page=beat.page) as page_span:
+            # Illustration: try to embed image if file exists, otherwise show prompt
+            img_path = _resolve_image_path(story, beat.page)
+
+            if cache is None:
+                _draw_story_page(c, beat, img_path, width, height, margin)
+                c.showPage()
+                continue
+
+            image_key = _file_digest(img_path) if img_path else None
+            key = _fragment_key("page", beat.page, beat.summary, image_key, pagesize)
+            cached = cache.get_page(key)
+            if page_span is not None:
+                page_span.args["cached"] = cached is not None
+            if cached is not None:
+                _replay_fragment(c, *cached)
+            else:
+                start = len(c._code)
+                drawn_images = _draw_story_page(
+                    c,
+                    beat,
                     img_path,
+                    width,
+                    height,
                     margin,
-                    image_bottom,
-                    width=img_width,
-                    height=img_height,
-                    preserveAspectRatio=True,
-                    anchor="sw",
+                    image_key=image_key,
+                    cache=cache,
                 )
-            except Exception as img_err:
-                # Fallback to prompt text if image fails
-                logging.warning(
-                    "Failed to draw image for page %s (%s): %s",
-                    beat.page,
-                    img_path,
-                    img_err,
+                cache.put_page(
+                    key, PageFragment(ops=c._code[start:], images=drawn_images)
                 )
-                img_path = None
-
-        if not img_path:
-            # Log the problem and draw a big red flag placeholder instead of the image
-            logging.warning(
-                "Could not find illustration image on disk for page %s. "
-                "Rendering a red missing-image flag in the PDF instead.",
-                beat.page,
-            )
-
-            # Draw red rectangle in the image area
-            c.setFillColorRGB(1, 0, 0)  # red
-            c.rect(
-                margin,
-                image_bottom,
-                width - 2 * margin,
-                available_height_for_image,
-                fill=1,
-                stroke=0,
-            )
-
-            # Draw warning text on top of the rectangle
-            c.setFillColorRGB(1, 1, 1)  # white text
-            c.setFont("Helvetica-Bold", 18)
-            text_y = image_bottom + available_height_for_image / 2
-            c.drawCentredString(
-                width / 2,
-                text_y,
-                "ILLUSTRATION MISSING",
-            )
-
-            # Reset fill color back to black for subsequent content
-            c.setFillColorRGB(0, 0, 0)
-
-        c.showPage()
-
-    c.save()
+            c.showPage()
@@ -1,13 +1,35 @@
 import logging
+import math
 import os
-from typing import Dict
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from itertools import islice
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from google.genai import types as genai_types
-from google.genai.types import GenerateContentConfig, Modality
+from google.genai.types import GenerateContentConfig, HttpOptions, Modality
 from langchain_core.output_parsers import PydanticOutputParser, StrOutputParser
 
+from tofula.src import tracing
+from tofula.src.deadline import Deadline, DeadlineExceeded
 from tofula.src.llm_factory import get_chat_llm, get_image_client, build_chain
+from tofula.src.narration import (
+    DEFAULT_VOICES,
+    AudioCache,
+    TTSBackend,
+    get_tts_backend,
+    narrate_story,
+    split_story_pages,
+)
+from tofula.src.storyboard import (
+    build_storyboard_prompt,
+    illustration_consistency,
+    slice_storyboard,
+)
+from tofula.src.streaming import IncrementalPromptParser, prefetch
 from tofula.src.structures import (
+    IllustrationPrompt,
     IllustrationPrompts,
     ModerationResult,
     StoryOutline,
@@ -15,8 +37,67 @@ from tofula.src.structures import (
     StoryTemplate,
 )
 
+if TYPE_CHECKING:
+    from tofula.src.recording import Cassette
+    from tofula.src.template_index import TemplateIndex
+
 logger = logging.getLogger(__name__)
 
+# Inputs and upstream stage outputs read by each stage (mirrors the pre_fn
+# mappings of the chains); "illustrations" is the image generation step
+STAGE_DEPENDENCIES = {
+    "template": ("themes", "age"),
+    "outline": ("template", "child_name", "reading_level", "length", "tone"),
+    "draft": ("outline", "child_name", "length", "reading_level"),
+    "polish": ("draft", "reading_level", "tone"),
+    "moderation": ("polish",),
+    "illustration_prompts": ("polish", "style", "outline"),
+    "illustrations": ("illustration_prompts", "outline", "style"),
+}
+
+
+def _balanced_group_sizes(
+    expected_pages: Optional[int], max_size: int
+) -> Iterator[int]:
+    """
+    Yield page counts for consecutive image calls of at most ``max_size``.
+
+    The first ``expected_pages`` pages are spread evenly over as few calls as
+    possible; any pages beyond that (or all, if unknown) use ``max_size``.
+    """
+    if expected_pages:
+        num_calls = math.ceil(expected_pages / max_size)
+        base, extra = divmod(expected_pages, num_calls)
+        for index in range(num_calls):
+            yield base + 1 if index < extra else base
+    while True:
+        yield max_size
+
+
+class ModerationRejected(ValueError):
+    """
+    Raised when a story still fails moderation after all repair attempts.
+
+    ``repair_stats`` holds the attempts made, the seconds spent repairing and
+    the moderation reason of every rejection, like
+    ``metadata["moderation_repair"]`` of an accepted story.
+    """
+
+    def __init__(self, message: str, repair_stats: dict):
+        super().__init__(message)
+        self.repair_stats = repair_stats
+
+
+def stale_stages(changed: Iterable[str]) -> List[str]:
+    """Return the stages (in run order) invalidated by changed inputs/outputs."""
+    dirty = set(changed)
+    stale = []
+    for stage, dependencies in STAGE_DEPENDENCIES.items():
+        if dirty.intersection(dependencies):
+            dirty.add(stage)
+            stale.append(stage)
+    return stale
+
 
 class StoryGenerationPipeline:
     """
@@ -35,11 +116,63 @@ class StoryGenerationPipeline:
         moderation_model: str = "gemini-2.0-flash-lite",
         polish_model: str = "gemini-2.0-flash-exp",
         image_model: str = "gemini-2.5-flash-image",
+        cassette: Optional["Cassette"] = None,
+        storyboard_pages: int = 1,
+        page_aspect_ratio: float = 1.0,
+        stream_illustration_prompts: bool = True,
+        max_image_attempts: int = 1,
+        template_index: Optional["TemplateIndex"] = None,
+        max_repair_attempts: int = 2,
+        tts_backend: Optional[TTSBackend] = None,
+        tts_voice: Optional[str] = None,
+        max_tts_concurrency: int = 4,
+        audio_cache: Optional[AudioCache] = None,
     ):
-        """Initialize the pipeline with specified models."""
-        self.story_llm = get_chat_llm(story_model, temperature=0.7)
-        self.moderation_llm = get_chat_llm(moderation_model, temperature=0.0)
-        self.polish_llm = get_chat_llm(polish_model, temperature=0.4)
+        """
+        Initialize the pipeline with specified models.
+
+        If a cassette is given, chat, image and remote TTS calls are recorded
+        to it or replayed from it instead of going straight to the providers.
+
+        With storyboard_pages > 1, each image call draws a storyboard sheet
+        covering that many consecutive pages, which is sliced locally into
+        per-page images of width/height = page_aspect_ratio.
+
+        With stream_illustration_prompts, illustration prompts are parsed from
+        the streamed LLM output and image generation starts as soon as the
+        first page's prompt is complete.
+
+        Each image call is attempted up to max_image_attempts times (no
+        retries by default).
+
+        With a template_index, the template stage is served from previously
+        generated templates for similar themes and age, and new templates are
+        added to it.
+
+        A story rejected by moderation is revised by a repair step that
+        addresses only the moderation reason, up to max_repair_attempts times,
+        before generation fails.
+
+        With generate_tts, each page is narrated through tts_backend (Gemini
+        TTS by default) with up to max_tts_concurrency concurrent calls,
+        while the illustrations are generated. Segments are cached in
+        audio_cache by backend, voice and text.
+        """
+        self.cassette = cassette
+        self.storyboard_pages = storyboard_pages
+        self.page_aspect_ratio = page_aspect_ratio
+        self.stream_illustration_prompts = stream_illustration_prompts
+        self.max_image_attempts = max_image_attempts
+        self.template_index = template_index
+        self.max_repair_attempts = max_repair_attempts
+        self.tts_backend = tts_backend
+        self.tts_voice = tts_voice
+        self.max_tts_concurrency = max_tts_concurrency
+        self.audio_cache = audio_cache
+        chat_llm_factory = cassette.chat_llm if cassette else get_chat_llm
+        self.story_llm = chat_llm_factory(story_model, temperature=0.7)
+        self.moderation_llm = chat_llm_factory(moderation_model, temperature=0.0)
+        self.polish_llm = chat_llm_factory(polish_model, temperature=0.4)
         self.image_model = image_model
 
         # Initialize parsers
@@ -56,7 +189,11 @@ class StoryGenerationPipeline:
         self.draft_chain = self._create_draft_chain()
         self.polish_chain = self._create_polish_chain()
         self.moderation_chain = self._create_moderation_chain()
+        self.repair_chain = self._create_repair_chain()
         self.illustration_chain = self._create_illustration_chain()
+        self.illustration_stream_chain = self._create_illustration_chain(
+            parser=StrOutputParser()
+        )
 
     # --- Chain builders -------------------------------------------------
 
@@ -126,8 +263,27 @@ class StoryGenerationPipeline:
             parser=self.moderation_parser,
         )
 
-    def _create_illustration_chain(self):
-        """Chain to generate illustration prompts."""
+    def _create_repair_chain(self):
+        """Chain to revise a story rejected by moderation."""
+        return build_chain(
+            system_prompt_name="repair",
+            user_prompt_name="repair",
+            llm=self.polish_llm,
+            pre_fn=lambda x: {
+                "story": x["polished"],
+                "reason": x["reason"] or "Not safe for young children.",
+                "reading_level": x["reading_level"],
+                "tone": x["tone"],
+            },
+            parser=StrOutputParser(),
+        )
+
+    def _create_illustration_chain(self, parser=None):
+        """
+        Chain to generate illustration prompts.
+
+        Pass a string parser to get the raw JSON text, e.g. for streaming.
+        """
         return build_chain(
             system_prompt_name="illustration",
             user_prompt_name="illustration",
@@ -138,130 +294,373 @@ class StoryGenerationPipeline:
                 "num_pages": len(x["outline"].beats),
                 "format_instructions": self.illustration_parser.get_format_instructions(),
             },
-            parser=self.illustration_parser,
+            parser=parser or self.illustration_parser,
         )
 
+    def _stream_illustration_prompts(
+        self, inputs: dict
+    ) -> Iterator[IllustrationPrompt]:
+        """
+        Stream the illustration chain, yielding each prompt as soon as its
+        JSON object is complete.
+        """
+        parser = IncrementalPromptParser()
+        seen_pages = set()
+        with tracing.span("stage:illustration_prompts", "stage"):
+            for chunk in self.illustration_stream_chain.stream(
+                inputs, config=tracing.chain_config()
+            ):
+                for prompt in parser.feed(chunk):
+                    if prompt.page in seen_pages:
+                        continue
+                    seen_pages.add(prompt.page)
+                    yield prompt
+
+        if not seen_pages:
+            # Nothing could be parsed incrementally; parse the full response
+            logger.warning("Incremental prompt parsing failed, parsing full output")
+            yield from self.illustration_parser.parse(parser.text).prompts
+
+    # --- Narration ------------------------------------------------------
+
+    def _start_narration(
+        self, story_text: str, outline: StoryOutline, output_dir: str
+    ) -> Future:
+        """
+        Start narrating the story page by page on a background thread.
+
+        Returns a future for (full narration path, narration stats). Without
+        a configured tts_backend, a Gemini backend is created for this story;
+        that raises if it is unavailable (e.g. no GOOGLE_API_KEY). With a
+        cassette, remote backends are recorded or replayed like model calls.
+        """
+        if self.cassette:
+            backend = self.cassette.tts_backend(self.tts_backend)
+        else:
+            backend = self.tts_backend or get_tts_backend("gemini")
+        voice = self.tts_voice or DEFAULT_VOICES.get(backend.name, "default")
+        pages = dict(
+            zip(
+                [beat.page for beat in outline.beats],
+                split_story_pages(story_text, len(outline.beats)),
+            )
+        )
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tofula-tts")
+        future = executor.submit(
+            tracing.propagate(narrate_story),
+            pages,
+            backend,
+            voice,
+            os.path.join(output_dir, "audio"),
+            cache=self.audio_cache,
+            max_concurrency=self.max_tts_concurrency,
+        )
+        executor.shutdown(wait=False)
+        return future
+
     # --- Illustration images --------------------------------------------
 
+    CONSISTENCY_INSTRUCTIONS = (
+        "Make sure all recurring characters, especially the main child, "
+        "look visually consistent with the previous illustrations: "
+        "same face, hairstyle, skin tone, body shape, and clothing style. "
+        "Do NOT change the main character's identity or appearance."
+    )
+
+    def _get_image_client(self):
+        if self.cassette:
+            return self.cassette.image_client(self.image_model)
+        return get_image_client(self.image_model)
+
+    def _reference_image_parts(self, recent_image_paths: List[str]) -> list:
+        """Load the last two generated images to feed back for consistency."""
+        parts = []
+        for prev_path in recent_image_paths[-2:]:
+            try:
+                with open(prev_path, "rb") as img_f:
+                    parts.append(
+                        genai_types.Part.from_bytes(
+                            data=img_f.read(), mime_type="image/png"
+                        )
+                    )
+            except Exception as e:
+                logger.warning(
+                    "Failed to load previous illustration %s for consistency: %s",
+                    prev_path,
+                    str(e),
+                )
+        return parts
+
+    def _request_image(
+        self,
+        client,
+        model_name: str,
+        contents: list,
+        label: str,
+        attempts: int = 1,
+        deadline: Optional[Deadline] = None,
+    ) -> Optional[bytes]:
+        """
+        Call the image model and return the first inline image, if any.
+
+        Retries up to ``attempts`` times. With a deadline, each request is
+        given the remaining time as its HTTP timeout.
+        """
+        for attempt in range(1, attempts + 1):
+            if deadline is not None and deadline.expired():
+                break
+            image_bytes = self._request_image_once(
+                client, model_name, contents, label, deadline
+            )
+            if image_bytes:
+                return image_bytes
+            if attempt < attempts:
+                logger.info("Retrying image generation for %s", label)
+        return None
+
+    def _request_image_once(
+        self,
+        client,
+        model_name: str,
+        contents: list,
+        label: str,
+        deadline: Optional[Deadline] = None,
+    ) -> Optional[bytes]:
+        config = GenerateContentConfig(response_modalities=[Modality.IMAGE])
+        if deadline is not None and deadline.enabled:
+            timeout_ms = max(int(deadline.remaining() * 1000), 1)
+            config.http_options = HttpOptions(timeout=timeout_ms)
+        try:
+            with tracing.span("image_request", "image", label=label):
+                response = client.models.generate_content(
+                    model=model_name,
+                    contents=contents,
+                    config=config,
+                )
+        except Exception as e:
+            logger.warning("Image generation failed for %s: %s", label, str(e))
+            return None
+
+        image_bytes = None
+        # Extract first inline image, if any
+        try:
+            if response.candidates:
+                for candidate in response.candidates:
+                    if candidate.content and candidate.content.parts:
+                        for part in candidate.content.parts:
+                            inline = getattr(part, "inline_data", None)
+                            if inline and getattr(inline, "data", None):
+                                image_bytes = inline.data
+                                break
+                    if image_bytes:
+                        break
+        except Exception as e:
+            logger.warning("Failed to parse image bytes for %s: %s", label, str(e))
+
+        if not image_bytes:
+            logger.warning(
+                "No image bytes returned for %s from Gemini image model", label
+            )
+        return image_bytes
+
+    def _save_page_image(
+        self, image_bytes: bytes, page: int, output_dir: str
+    ) -> Optional[str]:
+        """Write a page image to disk and return its path."""
+        filename = f"page_{page}.png"
+        file_path = os.path.join(output_dir, filename)
+        try:
+            with tracing.span("file_write", "io", path=file_path):
+                with open(file_path, "wb") as f:
+                    f.write(image_bytes)
+            logger.info("Saved illustration for page %s to %s", page, file_path)
+            return file_path
+        except Exception as e:
+            logger.warning(
+                "Failed to save image for page %s to %s: %s",
+                page,
+                file_path,
+                str(e),
+            )
+            return None
+
     def _generate_illustration_images(
         self,
-        illustration_prompts: IllustrationPrompts,
+        illustration_prompts: Iterable[IllustrationPrompt],
         story_summary: str,
         output_dir: str = "temp",
-    ) -> Dict[int, str]:
+        deadline: Optional[Deadline] = None,
+        expected_pages: Optional[int] = None,
+        reference_paths: Optional[List[str]] = None,
+    ) -> Tuple[Dict[int, str], dict]:
         """
         Generate illustration images from prompts using Gemini image model.
 
-        Returns a mapping of page -> image URI (e.g. 'image://temp/page_1.png').
+        Uses one image call per page, or one call per storyboard sheet of
+        up to ``storyboard_pages`` consecutive pages when that mode is
+        enabled. Prompts may be a lazy iterator; each call starts as soon as
+        the prompts it needs are available.
+
+        With a deadline, calls that are projected to overrun it are degraded
+        (no chained reference images, no retries) and generation stops once
+        there is no time left for another call; the stats then report
+        ``deadline_reached`` and the applied ``degradations``. The projection
+        assumes ``expected_pages`` pages are rendered by this call; if given,
+        storyboard sheets are also balanced over that many pages (4 pages of
+        at most 3 per sheet become 2 + 2). A lone page is always drawn with
+        the per-page prompt rather than as a one-panel sheet.
+
+        Returns a mapping of page -> image URI (e.g. 'image://temp/page_1.png')
+        and stats (mode, image calls, latency, consistency) for the run.
         """
+        deadline = deadline or Deadline()
 
-        client, model_name = get_image_client(self.image_model)
+        client, model_name = self._get_image_client()
         os.makedirs(output_dir, exist_ok=True)
 
         images: Dict[int, str] = {}
         # Keep track of the last few generated images so we can feed them back
         # into subsequent image generation calls for visual consistency.
-        recent_image_paths = []
-
-        for prompt in illustration_prompts.prompts:
-            # Build a richer prompt that includes:
-            # - High-level story summary
-            # - Explicit instructions to keep characters visually consistent
-            prompt_lines = [
-                "High-level story summary:",
-                story_summary,
-                "",
-                "Current page illustration instructions:",
-                prompt.prompt,
-                "",
-                (
-                    "Make sure all recurring characters, especially the main child, "
-                    "look visually consistent with the previous illustrations: "
-                    "same face, hairstyle, skin tone, body shape, and clothing style. "
-                    "Do NOT change the main character's identity or appearance."
-                ),
-            ]
+        recent_image_paths: List[str] = list(reference_paths or [])
+        prompts = iter(illustration_prompts)
+        group_size = max(self.storyboard_pages, 1)
+        group_sizes = _balanced_group_sizes(expected_pages, group_size)
+        image_calls = 0
+        prompt_wait = 0.0
+        call_seconds: List[float] = []
+        degradations: List[str] = []
+        deadline_reached = False
+        start = time.perf_counter()
 
-            full_prompt = "\n".join(prompt_lines)
+        while True:
+            wait_start = time.perf_counter()
+            try:
+                # Idle time waiting on the prompt stream shows up in traces
+                with tracing.span("wait_prompts", "wait"):
+                    group = list(islice(prompts, next(group_sizes)))
+            except DeadlineExceeded:
+                deadline_reached = True
+                break
+            prompt_wait += time.perf_counter() - wait_start
+            if not group:
+                break
 
-            # Build multimodal contents: last two images (if any) + text prompt
-            contents = []
-            for prev_path in recent_image_paths[-2:]:
-                try:
-                    with open(prev_path, "rb") as img_f:
-                        contents.append(
-                            genai_types.Part.from_bytes(
-                                data=img_f.read(), mime_type="image/png"
-                            )
-                        )
-                except Exception as e:
-                    logger.warning(
-                        "Failed to load previous illustration %s for consistency: %s",
-                        prev_path,
-                        str(e),
-                    )
+            attempts = self.max_image_attempts
+            use_references = True
+            if deadline.enabled:
+                remaining = deadline.remaining()
+                avg_call = sum(call_seconds) / len(call_seconds) if call_seconds else 0
+                if remaining <= 0 or remaining < avg_call:
+                    deadline_reached = True
+                    break
+                pages_left = (expected_pages or 0) - len(images)
+                calls_left = max(math.ceil(pages_left / group_size), 1)
+                if avg_call * calls_left > remaining:
+                    # Projected to overrun: trade consistency and robustness
+                    # for latency on the remaining calls
+                    names = ["skipped_chained_references"]
+                    if attempts > 1:
+                        names.insert(0, "reduced_image_retries")
+                    attempts = 1
+                    use_references = False
+                    for name in names:
+                        if name not in degradations:
+                            degradations.append(name)
 
-            contents.append(full_prompt)
+            contents = (
+                self._reference_image_parts(recent_image_paths)
+                if use_references
+                else []
+            )
+            image_calls += 1
+            call_start = time.perf_counter()
 
-            try:
-                response = client.models.generate_content(
-                    model=model_name,
-                    contents=contents,
-                    config=GenerateContentConfig(
-                        response_modalities=[Modality.IMAGE],
-                    ),
+            if len(group) == 1:
+                prompt = group[0]
+                # Build a richer prompt that includes:
+                # - High-level story summary
+                # - Explicit instructions to keep characters visually consistent
+                prompt_lines = [
+                    "High-level story summary:",
+                    story_summary,
+                    "",
+                    "Current page illustration instructions:",
+                    prompt.prompt,
+                    "",
+                    self.CONSISTENCY_INSTRUCTIONS,
+                ]
+                contents.append("\n".join(prompt_lines))
+                image_bytes = self._request_image(
+                    client,
+                    model_name,
+                    contents,
+                    f"page {prompt.page}",
+                    attempts=attempts,
+                    deadline=deadline,
                 )
-            except Exception as e:
-                logger.warning(
-                    "Image generation failed for page %s: %s", prompt.page, str(e)
+                page_images = [image_bytes] if image_bytes else []
+            else:
+                pages_label = f"pages {group[0].page}-{group[-1].page}"
+                contents.append(
+                    build_storyboard_prompt(
+                        group, story_summary, self.CONSISTENCY_INSTRUCTIONS
+                    )
                 )
-                continue
-
-            image_bytes = None
-            # Extract first inline image, if any
-            try:
-                if response.candidates:
-                    for candidate in response.candidates:
-                        if candidate.content and candidate.content.parts:
-                            for part in candidate.content.parts:
-                                inline = getattr(part, "inline_data", None)
-                                if inline and getattr(inline, "data", None):
-                                    image_bytes = inline.data
-                                    break
-                        if image_bytes:
-                            break
-            except Exception as e:
-                logger.warning(
-                    "Failed to parse image bytes for page %s: %s", prompt.page, str(e)
+                sheet_bytes = self._request_image(
+                    client,
+                    model_name,
+                    contents,
+                    f"storyboard {pages_label}",
+                    attempts=attempts,
+                    deadline=deadline,
                 )
+                page_images = []
+                if sheet_bytes:
+                    try:
+                        with tracing.span("slice_storyboard", "image"):
+                            page_images = slice_storyboard(
+                                sheet_bytes,
+                                len(group),
+                                aspect_ratio=self.page_aspect_ratio,
+                            )
+                    except Exception as e:
+                        logger.warning(
+                            "Failed to slice storyboard for %s: %s",
+                            pages_label,
+                            str(e),
+                        )
+            call_seconds.append(time.perf_counter() - call_start)
 
-            if not image_bytes:
-                logger.warning(
-                    "No image bytes returned for page %s from Gemini image model",
-                    prompt.page,
-                )
-                continue
+            for prompt, image_bytes in zip(group, page_images):
+                file_path = self._save_page_image(image_bytes, prompt.page, output_dir)
+                if file_path:
+                    images[prompt.page] = f"image://{file_path}"
+                    # Remember this page's image path for future consistency
+                    recent_image_paths.append(file_path)
 
-            filename = f"page_{prompt.page}.png"
-            file_path = os.path.join(output_dir, filename)
-            try:
-                with open(file_path, "wb") as f:
-                    f.write(image_bytes)
-                images[prompt.page] = f"image://{file_path}"
-                logger.info(
-                    "Saved illustration for page %s to %s", prompt.page, file_path
-                )
-                # Remember this page's image path for future consistency
-                recent_image_paths.append(file_path)
-            except Exception as e:
-                logger.warning(
-                    "Failed to save image for page %s to %s: %s",
-                    prompt.page,
-                    file_path,
-                    str(e),
-                )
+        elapsed = time.perf_counter() - start
+        if deadline_reached:
+            logger.warning("Deadline reached, stopping illustration generation")
+            degradations.append("illustrations_pending")
+        consistency = None
+        try:
+            consistency = illustration_consistency(recent_image_paths)
+        except Exception as e:
+            logger.warning("Failed to score illustration consistency: %s", str(e))
 
-        return images
+        stats = {
+            "mode": "storyboard" if group_size > 1 else "per_page",
+            "pages_per_call": group_size,
+            "image_calls": image_calls,
+            "pages_generated": len(images),
+            "image_seconds": round(elapsed, 3),
+            "prompt_wait_seconds": round(prompt_wait, 3),
+            "consistency": consistency,
+            "deadline_reached": deadline_reached,
+            "degradations": degradations,
+        }
+        logger.info("Illustration stats: %s", stats)
+        return images, stats
 
     # --- Public API -----------------------------------------------------
 
@@ -275,6 +674,8 @@ class StoryGenerationPipeline:
         tone: str,
         style: str,
         generate_tts: bool = False,
+        output_dir: str = "temp",
+        deadline: Optional[float] = None,
     ) -> StoryOutput:
         """
         Generate a complete children's story.
@@ -288,87 +689,425 @@ class StoryGenerationPipeline:
             tone: Story tone (e.g., 'adventurous', 'calm')
             style: Illustration art style
             generate_tts: Whether to generate audio narration
+            output_dir: Directory where illustration images are written
+            deadline: Optional time budget in seconds. Stages get a share of
+                it and slow calls are abandoned; the story degrades (polish
+                skipped, no chained references or image retries, remaining
+                illustrations left pending for fill_pending_illustrations)
+                instead of overrunning. Applied degradations are recorded in
+                metadata['degradations'].
 
         Returns:
             StoryOutput with complete story and assets
         """
+        inputs = {
+            "themes": themes,
+            "child_name": child_name,
+            "age": age,
+            "reading_level": reading_level,
+            "length": length,
+            "tone": tone,
+            "style": style,
+            "generate_tts": generate_tts,
+        }
+        with tracing.span("generate_story", "story", child_name=child_name):
+            return self._run_stages(inputs, output_dir=output_dir, deadline=deadline)
+
+    def regenerate_story(
+        self,
+        previous: StoryOutput,
+        output_dir: str = "temp",
+        deadline: Optional[float] = None,
+        **changes,
+    ) -> StoryOutput:
+        """
+        Re-run only the stages invalidated by changed inputs.
+
+        Stage dependencies are declared in STAGE_DEPENDENCIES. Stages that do
+        not (transitively) read a changed input reuse the previous run's
+        output, and only pages whose illustration prompt changed (or that
+        have no image yet) are illustrated again. For example, changing only
+        ``style`` reruns the illustration prompts and images.
+
+        Args:
+            previous: Story returned by generate_story / regenerate_story
+            output_dir: Directory where new illustration images are written
+            deadline: Optional time budget in seconds (see generate_story)
+            **changes: New values for any generate_story input
+
+        Returns:
+            StoryOutput for the changed inputs
+        """
+        previous_inputs = previous.metadata.get("inputs")
+        if not previous_inputs or "template" not in previous.metadata:
+            raise ValueError(
+                "Previous story has no recorded inputs; generate it with "
+                "generate_story first."
+            )
+        unknown = set(changes) - set(previous_inputs)
+        if unknown:
+            raise TypeError(f"Unknown story inputs: {sorted(unknown)}")
+
+        changed = {k for k, v in changes.items() if v != previous_inputs[k]}
+        if "skipped_polish" in previous.metadata.get("degradations", []):
+            # The previous final text is the unpolished draft
+            changed.add("draft")
+        stale = stale_stages(changed)
+        logger.info("Changed inputs %s invalidate stages %s", changed, stale)
+
+        with tracing.span("regenerate_story", "story", stale=",".join(stale)):
+            return self._run_stages(
+                {**previous_inputs, **changes},
+                output_dir=output_dir,
+                deadline=deadline,
+                previous=previous,
+                stale=stale,
+            )
+
+    def _run_stages(
+        self,
+        inputs: dict,
+        output_dir: str = "temp",
+        deadline: Optional[float] = None,
+        previous: Optional[StoryOutput] = None,
+        stale: Iterable[str] = (),
+    ) -> StoryOutput:
+        """
+        Run the pipeline stages for ``inputs``.
+
+        With a previous story, stages not listed in ``stale`` reuse its
+        outputs instead of calling the models again.
+        """
+        themes = inputs["themes"]
+        child_name = inputs["child_name"]
+        age = inputs["age"]
+        reading_level = inputs["reading_level"]
+        length = inputs["length"]
+        tone = inputs["tone"]
+        style = inputs["style"]
+        generate_tts = inputs["generate_tts"]
+
+        stale = set(stale)
+        recomputed: List[str] = []
+
+        def _reuse(stage: str) -> bool:
+            if previous is not None and stage not in stale:
+                return True
+            recomputed.append(stage)
+            return False
+
+        budget = Deadline(deadline)
+        degradations: List[str] = []
+        # Routes chain/prompt/parser/LLM callbacks to the active tracer, if any
+        chain_config = tracing.chain_config()
         try:
             # Step 1: Generate template
-            logger.info("Step 1: Generating story template...")
-            template = self.template_chain.invoke({"themes": themes, "age": age})
+            template_source = "llm"
+            template_similarity = None
+            if _reuse("template"):
+                template = StoryTemplate.model_validate(previous.metadata["template"])
+                template_source = "previous"
+            else:
+                indexed = None
+                if self.template_index is not None:
+                    with tracing.span("template_index_lookup", "index"):
+                        indexed = self.template_index.lookup(themes, age)
+                if indexed is not None:
+                    logger.info("Step 1: Reusing an indexed story template...")
+                    template, template_similarity = indexed
+                    template_source = "index"
+                else:
+                    logger.info("Step 1: Generating story template...")
+                    template_start = time.perf_counter()
+                    template = budget.run(
+                        "template",
+                        self.template_chain.invoke,
+                        {"themes": themes, "age": age},
+                        config=chain_config,
+                    )
+                    if self.template_index is not None:
+                        self.template_index.add(
+                            themes,
+                            age,
+                            template,
+                            latency=time.perf_counter() - template_start,
+                        )
             logger.info("Template selected: %s", template.theme)
 
             # Step 2: Create outline
-            logger.info("Step 2: Creating story outline...")
-            outline = self.outline_chain.invoke(
-                {
-                    "template": template,
-                    "child_name": child_name,
-                    "reading_level": reading_level,
-                    "length": length,
-                    "tone": tone,
-                }
-            )
+            if _reuse("outline"):
+                outline = previous.outline
+            else:
+                logger.info("Step 2: Creating story outline...")
+                outline = budget.run(
+                    "outline",
+                    self.outline_chain.invoke,
+                    {
+                        "template": template,
+                        "child_name": child_name,
+                        "reading_level": reading_level,
+                        "length": length,
+                        "tone": tone,
+                    },
+                    config=chain_config,
+                )
             logger.info("Outline created: %s", outline.title)
 
             # Step 3: Write draft
-            logger.info("Step 3: Writing draft...")
-            draft = self.draft_chain.invoke(
-                {
-                    "outline": outline,
-                    "child_name": child_name,
-                    "length": length,
-                    "reading_level": reading_level,
-                }
-            )
+            if _reuse("draft"):
+                draft = previous.draft
+            else:
+                logger.info("Step 3: Writing draft...")
+                draft = budget.run(
+                    "draft",
+                    self.draft_chain.invoke,
+                    {
+                        "outline": outline,
+                        "child_name": child_name,
+                        "length": length,
+                        "reading_level": reading_level,
+                    },
+                    config=chain_config,
+                )
 
             # Step 4: Polish story
-            logger.info("Step 4: Polishing story...")
-            polished = self.polish_chain.invoke(
-                {
-                    "draft": draft,
-                    "reading_level": reading_level,
-                    "tone": tone,
-                }
-            )
+            if _reuse("polish"):
+                polished = previous.story_final
+            else:
+                logger.info("Step 4: Polishing story...")
+                try:
+                    polished = budget.run(
+                        "polish",
+                        self.polish_chain.invoke,
+                        {
+                            "draft": draft,
+                            "reading_level": reading_level,
+                            "tone": tone,
+                        },
+                        required=False,
+                        config=chain_config,
+                    )
+                except DeadlineExceeded as e:
+                    logger.warning("%s; using the unpolished draft", str(e))
+                    polished = draft
+                    degradations.append("skipped_polish")
 
-            # Step 5: Moderation check
-            logger.info("Step 5: Running content moderation...")
-            moderation_result = self.moderation_chain.invoke({"polished": polished})
+            # Step 5: Moderation check (a reused story already passed it)
+            repair_stats = {"attempts": 0, "seconds": 0.0, "reasons": []}
+            if not _reuse("moderation"):
+                logger.info("Step 5: Running content moderation...")
+                moderation_result = budget.run(
+                    "moderation",
+                    self.moderation_chain.invoke,
+                    {"polished": polished},
+                    config=chain_config,
+                )
+
+                # Step 5b: Revise only the rejected story instead of starting over
+                repair_start = time.perf_counter()
+                while not moderation_result.is_safe:
+                    repair_stats["reasons"].append(moderation_result.reason)
+                    if repair_stats["attempts"] >= self.max_repair_attempts:
+                        repair_stats["seconds"] = round(
+                            time.perf_counter() - repair_start, 3
+                        )
+                        logger.error(
+                            "Story failed moderation after %s repair attempts",
+                            repair_stats["attempts"],
+                            extra={"moderation_repair": repair_stats},
+                        )
+                        raise ModerationRejected(
+                            f"Story failed moderation after "
+                            f"{repair_stats['attempts']} repair attempts "
+                            f"in {repair_stats['seconds']}s: "
+                            + "; ".join(repair_stats["reasons"]),
+                            repair_stats,
+                        )
+                    repair_stats["attempts"] += 1
+                    logger.warning(
+                        "Story failed moderation (%s); repair attempt %s/%s",
+                        moderation_result.reason,
+                        repair_stats["attempts"],
+                        self.max_repair_attempts,
+                    )
+                    polished = budget.run(
+                        "repair",
+                        self.repair_chain.invoke,
+                        {
+                            "polished": polished,
+                            "reason": moderation_result.reason,
+                            "reading_level": reading_level,
+                            "tone": tone,
+                        },
+                        config=chain_config,
+                    )
+                    moderation_result = budget.run(
+                        "moderation",
+                        self.moderation_chain.invoke,
+                        {"polished": polished},
+                        config=chain_config,
+                    )
+                if repair_stats["attempts"]:
+                    repair_stats["seconds"] = round(
+                        time.perf_counter() - repair_start, 3
+                    )
+                logger.info("✓ Story passed moderation")
 
-            if not moderation_result.is_safe:
-                raise ValueError(f"Story failed moderation: {moderation_result.reason}")
-            logger.info("✓ Story passed moderation")
+            # Step 7 (started early): optional narration runs in the
+            # background while the illustrations are generated
+            narration = None
+            if generate_tts:
+                logger.info("Step 7: Generating audio narration...")
+                try:
+                    narration = self._start_narration(polished, outline, output_dir)
+                except Exception as e:
+                    # Keep the paid-for story; it just has no audio
+                    logger.warning("Narration unavailable: %s", str(e))
+                    degradations.append("narration_failed")
 
             # Step 6: Generate illustration prompts
-            logger.info("Step 6: Generating illustration prompts...")
-            illustration_prompts = self.illustration_chain.invoke(
-                {
-                    "polished": polished,
-                    "style": style,
-                    "outline": outline,
+            illustration_inputs = {
+                "polished": polished,
+                "style": style,
+                "outline": outline,
+            }
+            previous_prompts: Dict[int, str] = {}
+            previous_images: Dict[int, str] = {}
+            reference_paths: List[str] = []
+            if previous is not None:
+                previous_prompts = {
+                    int(page): prompt
+                    for page, prompt in previous.metadata.get(
+                        "illustration_prompts", {}
+                    ).items()
                 }
+                previous_images = dict(previous.illustrations or {})
+
+            if _reuse("illustration_prompts"):
+                illustration_prompts = [
+                    IllustrationPrompt(page=page, prompt=prompt)
+                    for page, prompt in sorted(previous_prompts.items())
+                ]
+            elif budget.expired():
+                illustration_prompts = []
+            elif self.stream_illustration_prompts:
+                logger.info("Step 6: Generating illustration prompts...")
+                # Prompts are parsed on a background thread while images for
+                # earlier pages are already being generated (Step 6b)
+                illustration_prompts = prefetch(
+                    self._stream_illustration_prompts(illustration_inputs),
+                    deadline=budget,
+                )
+            else:
+                logger.info("Step 6: Generating illustration prompts...")
+                try:
+                    illustration_prompts = budget.run(
+                        "illustration_prompts",
+                        self.illustration_chain.invoke,
+                        illustration_inputs,
+                        config=chain_config,
+                    ).prompts
+                except DeadlineExceeded as e:
+                    logger.warning(str(e))
+                    illustration_prompts = []
+
+            # Pages keep their previous image unless the page's prompt, the
+            # style or the outline (story summary) changed
+            reuse_images = (
+                previous is not None
+                and "outline" not in stale
+                and previous.metadata["inputs"]["style"] == style
             )
-            # Store prompts as simple mapping for downstream consumers (e.g., PDF)
-            illustration_prompt_map = {
-                p.page: p.prompt for p in illustration_prompts.prompts
-            }
+            kept_images: Dict[int, str] = {}
+            received_prompts: List[IllustrationPrompt] = []
+
+            def _keeps_image(prompt: IllustrationPrompt) -> bool:
+                return (
+                    reuse_images
+                    and bool(previous_images.get(prompt.page))
+                    and previous_prompts.get(prompt.page) == prompt.prompt
+                )
+
+            def _pages_to_render(prompts):
+                for prompt in prompts:
+                    received_prompts.append(prompt)
+                    if _keeps_image(prompt):
+                        kept_images[prompt.page] = previous_images[prompt.page]
+                        continue
+                    yield prompt
+
+            if isinstance(illustration_prompts, list):
+                expected_pages = sum(
+                    1 for p in illustration_prompts if not _keeps_image(p)
+                )
+            else:
+                # Streamed prompts are freshly generated, so (nearly) every
+                # page is rendered again
+                expected_pages = len(outline.beats)
+
+            if previous is not None and "illustration_prompts" not in stale:
+                # Only missing pages are rendered; chain from the images before them
+                missing = [
+                    p.page
+                    for p in illustration_prompts
+                    if p.page not in previous_images
+                ]
+                if missing:
+                    reference_paths = [
+                        previous_images[page][len("image://") :]
+                        for page in sorted(previous_images)
+                        if page < missing[0]
+                        and previous_images[page].startswith("image://")
+                    ][-2:]
 
             # High-level story summary used to help keep illustrations consistent
             story_summary = "; ".join(beat.summary for beat in outline.beats)
 
             logger.info("Step 6b: Generating illustration images with Gemini...")
-            illustrations = self._generate_illustration_images(
-                illustration_prompts,
-                story_summary=story_summary,
-                output_dir="temp",
-            )
+            with tracing.span("stage:illustrations", "stage"):
+                new_images, illustration_stats = self._generate_illustration_images(
+                    _pages_to_render(illustration_prompts),
+                    story_summary=story_summary,
+                    output_dir=output_dir,
+                    deadline=budget,
+                    expected_pages=expected_pages,
+                    reference_paths=reference_paths,
+                )
+            illustrations = {**kept_images, **new_images}
+            if previous is None or illustration_stats["image_calls"]:
+                recomputed.append("illustrations")
+            # Store prompts as simple mapping for downstream consumers (e.g., PDF)
+            illustration_prompt_map = {p.page: p.prompt for p in received_prompts}
+
+            pending_illustrations = []
+            if budget.expired() or illustration_stats["deadline_reached"]:
+                pending_illustrations = [
+                    beat.page
+                    for beat in outline.beats
+                    if beat.page not in illustrations
+                ]
+            for name in illustration_stats["degradations"]:
+                if name not in degradations:
+                    degradations.append(name)
+            if pending_illustrations and "illustrations_pending" not in degradations:
+                degradations.append("illustrations_pending")
 
-            # Step 7: Optional TTS
+            # Step 7: Collect the narration
             audio = None
-            if generate_tts:
-                logger.info("Step 7: Generating audio narration...")
-                audio = "tts://audio/story_narration.mp3"
+            narration_stats = None
+            if narration is not None:
+                timeout = budget.remaining() if budget.enabled else None
+                try:
+                    with tracing.span("wait_narration", "wait"):
+                        audio_path, narration_stats = narration.result(timeout)
+                    if audio_path:
+                        audio = f"audio://{audio_path}"
+                except FutureTimeoutError:
+                    logger.warning("Deadline reached, skipping narration")
+                    degradations.append("skipped_narration")
+                except Exception as e:
+                    logger.warning("Narration failed: %s", str(e))
+                    degradations.append("narration_failed")
 
             # Assemble output
             output = StoryOutput(
@@ -384,8 +1123,23 @@ class StoryGenerationPipeline:
                     "theme": template.theme,
                     "length": length,
                     "illustration_prompts": illustration_prompt_map,
+                    "illustration_stats": illustration_stats,
+                    "style": style,
+                    "deadline_seconds": deadline,
+                    "elapsed_seconds": round(budget.elapsed(), 3),
+                    "degradations": degradations,
+                    "pending_illustrations": pending_illustrations,
+                    "inputs": inputs,
+                    "template": template.model_dump(),
+                    "template_source": template_source,
+                    "template_similarity": template_similarity,
+                    "moderation_repair": repair_stats,
+                    "narration": narration_stats,
+                    "recomputed_stages": recomputed,
                 },
             )
+            if degradations:
+                logger.warning("Story degraded to meet deadline: %s", degradations)
 
             logger.info("✓ Story generation complete!")
             return output
@@ -393,3 +1147,63 @@ class StoryGenerationPipeline:
         except Exception as e:
             logger.error("Error in story generation: %s", str(e))
             raise
+
+    def fill_pending_illustrations(
+        self, story: StoryOutput, output_dir: str = "temp"
+    ) -> StoryOutput:
+        """
+        Generate the illustrations a deadline-bound run left pending.
+
+        Meant to run in the background after the story was returned. Missing
+        illustration prompts are regenerated from the final story. Updates
+        and returns the given story.
+        """
+        pending = story.metadata.get("pending_illustrations") or []
+        if not pending:
+            return story
+
+        prompt_map = {
+            int(page): prompt
+            for page, prompt in story.metadata.get("illustration_prompts", {}).items()
+        }
+        if any(page not in prompt_map for page in pending):
+            generated = self.illustration_chain.invoke(
+                {
+                    "polished": story.story_final,
+                    "style": story.metadata.get("style", ""),
+                    "outline": story.outline,
+                },
+                config=tracing.chain_config(),
+            )
+            for prompt in generated.prompts:
+                prompt_map.setdefault(prompt.page, prompt.prompt)
+
+        pending = sorted(pending)
+        prompts = [
+            IllustrationPrompt(page=page, prompt=prompt_map[page])
+            for page in pending
+            if page in prompt_map
+        ]
+        # Chain from the illustrations that precede the first pending page
+        existing = story.illustrations or {}
+        reference_paths = [
+            existing[page][len("image://") :]
+            for page in sorted(existing)
+            if page < pending[0] and existing[page].startswith("image://")
+        ]
+
+        logger.info("Filling %s pending illustrations...", len(prompts))
+        images, _ = self._generate_illustration_images(
+            prompts,
+            story_summary="; ".join(beat.summary for beat in story.outline.beats),
+            output_dir=output_dir,
+            expected_pages=len(prompts),
+            reference_paths=reference_paths[-2:],
+        )
+
+        story.illustrations = {**existing, **images}
+        story.metadata["illustration_prompts"] = prompt_map
+        story.metadata["pending_illustrations"] = [
+            page for page in pending if page not in images
+        ]
+        return story
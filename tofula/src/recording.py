@@ -0,0 +1,504 @@
+"""
+Record/replay harness for offline load tests.
+
+A Cassette sits between StoryGenerationPipeline and its providers:
+  - record mode wraps the real chat models, the Gemini image client and remote
+    TTS backends, capturing request fingerprints, responses, image and audio
+    bytes and latencies
+  - replay mode serves the recorded responses back with the recorded timing
+    (optionally scaled), so the pipeline and PDF export can be load tested
+    against production-shaped traffic with no network access
+
+Cassettes are JSONL files with one recorded interaction per line.
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional
+
+from google.genai import types as genai_types
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from tofula.src.llm_factory import get_chat_llm, get_image_client
+from tofula.src.narration import TTSBackend, get_tts_backend
+
+logger = logging.getLogger(__name__)
+
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode when a request was never recorded."""
+
+
+def _fingerprint(kind: str, model: str, payload: Any) -> str:
+    encoded = json.dumps([kind, model, payload], sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _messages_payload(messages: List[BaseMessage]) -> list:
+    return [[m.type, m.content] for m in messages]
+
+
+def _contents_payload(contents: Any) -> list:
+    """Reduce generate_content contents to text and hashes of inline bytes."""
+    if not isinstance(contents, (list, tuple)):
+        contents = [contents]
+    payload = []
+    for item in contents:
+        inline = getattr(item, "inline_data", None)
+        if inline is not None and getattr(inline, "data", None):
+            payload.append(["bytes", hashlib.sha256(inline.data).hexdigest()])
+        elif isinstance(item, str):
+            payload.append(["text", item])
+        else:
+            payload.append(["other", getattr(item, "text", None) or str(item)])
+    return payload
+
+
+class Cassette:
+    """
+    Recorded provider interactions for a set of pipeline runs.
+
+    Args:
+        path: JSONL file the cassette is loaded from / saved to
+        mode: 'record' to capture live traffic, 'replay' to serve it back
+        time_scale: Multiplier applied to recorded latencies on replay
+            (1.0 = real timing, 0.0 = no delay)
+    """
+
+    def __init__(self, path: str, mode: str = "replay", time_scale: float = 1.0):
+        if mode not in {"record", "replay"}:
+            raise ValueError("mode must be 'record' or 'replay'")
+        self.path = path
+        self.mode = mode
+        self.time_scale = time_scale
+        self._interactions: Dict[str, List[dict]] = {}
+        self._replay_counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        if mode == "replay":
+            self._load()
+
+    # --- Storage --------------------------------------------------------
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"Cassette not found: {self.path}")
+        count = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                interaction = json.loads(line)
+                self._interactions.setdefault(interaction["fingerprint"], []).append(
+                    interaction
+                )
+                count += 1
+        logger.info("Loaded %s recorded interactions from %s", count, self.path)
+
+    def save(self) -> None:
+        """Write all recorded interactions to the cassette file."""
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        with self._lock:
+            interactions = [i for group in self._interactions.values() for i in group]
+        with open(self.path, "w", encoding="utf-8") as f:
+            for interaction in interactions:
+                f.write(json.dumps(interaction) + "\n")
+        logger.info("Saved %s interactions to %s", len(interactions), self.path)
+
+    def record(self, interaction: dict) -> None:
+        with self._lock:
+            self._interactions.setdefault(interaction["fingerprint"], []).append(
+                interaction
+            )
+
+    def lookup(self, fingerprint: str) -> dict:
+        """
+        Return the recorded interaction for a fingerprint.
+
+        Repeated requests cycle through all recordings of the same fingerprint,
+        so one recorded story can be replayed by many concurrent copies.
+        """
+        with self._lock:
+            recorded = self._interactions.get(fingerprint)
+            if not recorded:
+                raise CassetteMiss(f"No recorded interaction for {fingerprint[:12]}")
+            index = self._replay_counters.get(fingerprint, 0)
+            self._replay_counters[fingerprint] = index + 1
+        return recorded[index % len(recorded)]
+
+    def wait(self, seconds: float) -> None:
+        """Sleep for a recorded latency, scaled by time_scale."""
+        delay = seconds * self.time_scale
+        if delay > 0:
+            time.sleep(delay)
+
+    # --- Provider factories ---------------------------------------------
+
+    def chat_llm(self, model: str, temperature: float):
+        """Drop-in replacement for llm_factory.get_chat_llm."""
+        if self.mode == "record":
+            return RecordingChatModel(
+                inner=get_chat_llm(model, temperature=temperature),
+                cassette=self,
+                model_id=model,
+            )
+        return ReplayChatModel(cassette=self, model_id=model)
+
+    def image_client(self, model: str):
+        """Drop-in replacement for llm_factory.get_image_client."""
+        if self.mode == "record":
+            client, model_name = get_image_client(model)
+            return RecordingImageClient(client, self), model_name
+        return ReplayImageClient(self), model
+
+    def tts_backend(
+        self, backend: Optional[TTSBackend] = None, kind: str = "gemini"
+    ) -> TTSBackend:
+        """
+        Wrap a TTS backend (by default a new ``kind`` backend) for this cassette.
+
+        Local backends need no network and are returned as is. In replay mode
+        no real backend is created, so replay works offline.
+        """
+        if backend is not None and not backend.remote:
+            return backend
+        if self.mode == "record":
+            return RecordingTTSBackend(backend or get_tts_backend(kind), self)
+        return ReplayTTSBackend(self, backend.name if backend else kind)
+
+
+# --- Chat models -------------------------------------------------------
+
+
+class RecordingChatModel(BaseChatModel):
+    """Chat model wrapper that records every call to a cassette."""
+
+    inner: Any
+    cassette: Any
+    model_id: str
+
+    @property
+    def _llm_type(self) -> str:
+        return "tofula-recording"
+
+    def _record(self, messages, content, latency: float, first_chunk: float):
+        self.cassette.record(
+            {
+                "kind": "chat",
+                "model": self.model_id,
+                "fingerprint": _fingerprint(
+                    "chat", self.model_id, _messages_payload(messages)
+                ),
+                "content": content,
+                "latency": latency,
+                "first_chunk_latency": first_chunk,
+            }
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        start = time.perf_counter()
+        message = self.inner.invoke(messages, stop=stop, **kwargs)
+        latency = time.perf_counter() - start
+        self._record(messages, message.content, latency, latency)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self, messages, stop=None, run_manager=None, **kwargs
+    ) -> Iterator[ChatGenerationChunk]:
+        start = time.perf_counter()
+        first_chunk = None
+        full = None
+        for chunk in self.inner.stream(messages, stop=stop, **kwargs):
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - start
+            full = chunk if full is None else full + chunk
+            yield ChatGenerationChunk(message=chunk)
+        latency = time.perf_counter() - start
+        content = full.content if full is not None else ""
+        self._record(messages, content, latency, first_chunk or latency)
+
+
+class ReplayChatModel(BaseChatModel):
+    """Chat model that serves recorded responses with the recorded timing."""
+
+    cassette: Any
+    model_id: str
+    chunk_size: int = 64
+
+    @property
+    def _llm_type(self) -> str:
+        return "tofula-replay"
+
+    def _lookup(self, messages) -> dict:
+        return self.cassette.lookup(
+            _fingerprint("chat", self.model_id, _messages_payload(messages))
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        interaction = self._lookup(messages)
+        self.cassette.wait(interaction["latency"])
+        message = AIMessage(content=interaction["content"])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self, messages, stop=None, run_manager=None, **kwargs
+    ) -> Iterator[ChatGenerationChunk]:
+        interaction = self._lookup(messages)
+        content = interaction["content"]
+        first_chunk = interaction.get("first_chunk_latency", interaction["latency"])
+        self.cassette.wait(first_chunk)
+
+        if not isinstance(content, str):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=content))
+            return
+
+        # Spread the remaining latency evenly over the replayed chunks
+        pieces = [
+            content[i : i + self.chunk_size]
+            for i in range(0, len(content), self.chunk_size)
+        ] or [""]
+        per_chunk = max(interaction["latency"] - first_chunk, 0.0) / len(pieces)
+        for index, piece in enumerate(pieces):
+            if index:
+                self.cassette.wait(per_chunk)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+
+
+# --- Image clients ----------------------------------------------------
+
+
+class _Models:
+    def __init__(self, generate_content):
+        self.generate_content = generate_content
+
+
+class RecordingImageClient:
+    """genai.Client stand-in that records generate_content calls."""
+
+    def __init__(self, client, cassette: Cassette):
+        self._client = client
+        self._cassette = cassette
+        self.models = _Models(self._generate_content)
+
+    def _generate_content(self, *, model: str, contents: Any, config: Any = None):
+        fingerprint = _fingerprint("image", model, _contents_payload(contents))
+        start = time.perf_counter()
+        try:
+            response = self._client.models.generate_content(
+                model=model, contents=contents, config=config
+            )
+        except Exception as e:
+            self._cassette.record(
+                {
+                    "kind": "image",
+                    "model": model,
+                    "fingerprint": fingerprint,
+                    "error": str(e),
+                    "latency": time.perf_counter() - start,
+                }
+            )
+            raise
+        latency = time.perf_counter() - start
+
+        parts = []
+        for candidate in response.candidates or []:
+            if not (candidate.content and candidate.content.parts):
+                continue
+            for part in candidate.content.parts:
+                inline = getattr(part, "inline_data", None)
+                if inline and getattr(inline, "data", None):
+                    parts.append(
+                        {
+                            "mime_type": inline.mime_type or "image/png",
+                            "data": base64.b64encode(inline.data).decode("ascii"),
+                        }
+                    )
+                elif getattr(part, "text", None):
+                    parts.append({"text": part.text})
+
+        self._cassette.record(
+            {
+                "kind": "image",
+                "model": model,
+                "fingerprint": fingerprint,
+                "parts": parts,
+                "latency": latency,
+            }
+        )
+        return response
+
+
+class ReplayImageClient:
+    """genai.Client stand-in that serves recorded image responses."""
+
+    def __init__(self, cassette: Cassette):
+        self._cassette = cassette
+        self.models = _Models(self._generate_content)
+
+    def _generate_content(self, *, model: str, contents: Any, config: Any = None):
+        interaction = self._cassette.lookup(
+            _fingerprint("image", model, _contents_payload(contents))
+        )
+        self._cassette.wait(interaction["latency"])
+        if "error" in interaction:
+            raise RuntimeError(f"Recorded image error: {interaction['error']}")
+
+        parts = []
+        for part in interaction["parts"]:
+            if "data" in part:
+                parts.append(
+                    genai_types.Part.from_bytes(
+                        data=base64.b64decode(part["data"]),
+                        mime_type=part["mime_type"],
+                    )
+                )
+            else:
+                parts.append(genai_types.Part.from_text(text=part["text"]))
+
+        return genai_types.GenerateContentResponse(
+            candidates=[
+                genai_types.Candidate(
+                    content=genai_types.Content(role="model", parts=parts)
+                )
+            ]
+        )
+
+
+# --- Speech -----------------------------------------------------------
+
+
+class RecordingTTSBackend(TTSBackend):
+    """TTS backend wrapper that records every synthesis to a cassette."""
+
+    def __init__(self, inner: TTSBackend, cassette: Cassette):
+        self.inner = inner
+        self.name = inner.name
+        self._cassette = cassette
+
+    def synthesize(self, text: str, voice: str) -> bytes:
+        fingerprint = _fingerprint("tts", self.name, [voice, text])
+        start = time.perf_counter()
+        try:
+            audio = self.inner.synthesize(text, voice)
+        except Exception as e:
+            self._cassette.record(
+                {
+                    "kind": "tts",
+                    "model": self.name,
+                    "fingerprint": fingerprint,
+                    "error": str(e),
+                    "latency": time.perf_counter() - start,
+                }
+            )
+            raise
+        self._cassette.record(
+            {
+                "kind": "tts",
+                "model": self.name,
+                "fingerprint": fingerprint,
+                "audio": base64.b64encode(audio).decode("ascii"),
+                "latency": time.perf_counter() - start,
+            }
+        )
+        return audio
+
+
+class ReplayTTSBackend(TTSBackend):
+    """TTS backend that serves recorded audio with the recorded timing."""
+
+    def __init__(self, cassette: Cassette, name: str):
+        self.name = name
+        self._cassette = cassette
+
+    def synthesize(self, text: str, voice: str) -> bytes:
+        interaction = self._cassette.lookup(
+            _fingerprint("tts", self.name, [voice, text])
+        )
+        self._cassette.wait(interaction["latency"])
+        if "error" in interaction:
+            raise RuntimeError(f"Recorded TTS error: {interaction['error']}")
+        return base64.b64decode(interaction["audio"])
+
+
+# --- Load testing -----------------------------------------------------
+
+
+def run_replay_load_test(
+    cassette_path: str,
+    story_inputs: List[dict],
+    num_stories: int,
+    concurrency: int,
+    time_scale: float = 1.0,
+    output_root: str = os.path.join("temp", "replay"),
+    pdf_dir: Optional[str] = None,
+    **pipeline_kwargs,
+) -> dict:
+    """
+    Replay recorded traffic for ``num_stories`` stories, ``concurrency`` at a time.
+
+    Story inputs are cycled, so a cassette recorded from a handful of stories
+    can drive a much larger load. Each story writes its images to its own
+    directory under ``output_root`` and, if ``pdf_dir`` is set, exports a PDF.
+
+    Returns latency and throughput statistics for the run.
+    """
+    from tofula.src.pdf_export import save_story_to_pdf
+    from tofula.src.pipeline import StoryGenerationPipeline
+
+    cassette = Cassette(cassette_path, mode="replay", time_scale=time_scale)
+    pipeline = StoryGenerationPipeline(cassette=cassette, **pipeline_kwargs)
+    if pdf_dir:
+        os.makedirs(pdf_dir, exist_ok=True)
+
+    def _run_one(index: int) -> float:
+        story_input = story_inputs[index % len(story_inputs)]
+        start = time.perf_counter()
+        story = pipeline.generate_story(
+            **story_input, output_dir=os.path.join(output_root, f"story_{index:05d}")
+        )
+        if pdf_dir:
+            save_story_to_pdf(story, os.path.join(pdf_dir, f"story_{index:05d}.pdf"))
+        return time.perf_counter() - start
+
+    latencies: List[float] = []
+    failures = 0
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(_run_one, i) for i in range(num_stories)]
+        for future in as_completed(futures):
+            try:
+                latencies.append(future.result())
+            except Exception as e:
+                failures += 1
+                logger.warning("Replayed story failed: %s", str(e))
+    wall = time.perf_counter() - wall_start
+
+    latencies.sort()
+    stats = {
+        "stories": num_stories,
+        "concurrency": concurrency,
+        "failures": failures,
+        "wall_seconds": wall,
+        "stories_per_second": len(latencies) / wall if wall > 0 else 0.0,
+    }
+    if latencies:
+        p95_index = min(len(latencies) - 1, int(0.95 * len(latencies)))
+        stats.update(
+            {
+                "latency_p50": statistics.median(latencies),
+                "latency_p95": latencies[p95_index],
+                "latency_max": latencies[-1],
+            }
+        )
+    return stats
@@ -0,0 +1,138 @@
+"""
+Helpers for storyboard-sheet illustration mode.
+
+Instead of one image call per page, the image model is asked for a single
+sheet laid out as a grid of panels, one panel per page. The sheet is then
+sliced locally into per-page images.
+"""
+
+import io
+import math
+from typing import List, Optional, Sequence, Tuple
+
+from tofula.src.structures import IllustrationPrompt
+
+
+def _require_pil():
+    try:
+        from PIL import Image
+    except ImportError as exc:
+        raise ImportError(
+            "Pillow is required for storyboard illustrations. Install it with "
+            "`pip install pillow`."
+        ) from exc
+    return Image
+
+
+def storyboard_grid(num_panels: int) -> Tuple[int, int]:
+    """Return the (rows, cols) of the most square grid holding num_panels."""
+    cols = math.ceil(math.sqrt(num_panels))
+    rows = math.ceil(num_panels / cols)
+    return rows, cols
+
+
+def build_storyboard_prompt(
+    prompts: Sequence[IllustrationPrompt],
+    story_summary: str,
+    consistency_instructions: str,
+) -> str:
+    """Build the text prompt asking for one sheet covering several pages."""
+    rows, cols = storyboard_grid(len(prompts))
+    lines = [
+        "High-level story summary:",
+        story_summary,
+        "",
+        (
+            f"Draw a storyboard sheet: a grid of {rows} rows by {cols} columns "
+            "of equally sized panels that fill the whole image. Panels are read "
+            "left to right, top to bottom. Do NOT draw borders, gutters, panel "
+            "numbers, captions or any text."
+        ),
+        "",
+    ]
+    for index, prompt in enumerate(prompts, start=1):
+        lines.append(f"Panel {index} (page {prompt.page}): {prompt.prompt}")
+    if len(prompts) < rows * cols:
+        lines.append("Leave the remaining panels plain white.")
+    lines.extend(["", consistency_instructions])
+    return "\n".join(lines)
+
+
+def _crop_to_aspect(box: Tuple[int, int, int, int], aspect_ratio: float):
+    """Center-crop a (left, top, right, bottom) box to width/height = aspect_ratio."""
+    left, top, right, bottom = box
+    width, height = right - left, bottom - top
+    if width / height > aspect_ratio:
+        new_width = int(round(height * aspect_ratio))
+        left += (width - new_width) // 2
+        right = left + new_width
+    else:
+        new_height = int(round(width / aspect_ratio))
+        top += (height - new_height) // 2
+        bottom = top + new_height
+    return left, top, right, bottom
+
+
+def slice_storyboard(
+    image_bytes: bytes,
+    num_panels: int,
+    aspect_ratio: float = 1.0,
+    inset: float = 0.01,
+) -> List[bytes]:
+    """
+    Slice a storyboard sheet into per-panel PNG images.
+
+    Each grid cell is shrunk by ``inset`` (fraction of the cell size) on every
+    side to drop stray gutters, then center-cropped to ``aspect_ratio``.
+    """
+    Image = _require_pil()
+    rows, cols = storyboard_grid(num_panels)
+
+    with Image.open(io.BytesIO(image_bytes)) as sheet:
+        sheet = sheet.convert("RGB")
+        cell_width = sheet.width / cols
+        cell_height = sheet.height / rows
+
+        panels = []
+        for index in range(num_panels):
+            row, col = divmod(index, cols)
+            box = (
+                int(col * cell_width + inset * cell_width),
+                int(row * cell_height + inset * cell_height),
+                int((col + 1) * cell_width - inset * cell_width),
+                int((row + 1) * cell_height - inset * cell_height),
+            )
+            panel = sheet.crop(_crop_to_aspect(box, aspect_ratio))
+            buffer = io.BytesIO()
+            panel.save(buffer, format="PNG")
+            panels.append(buffer.getvalue())
+    return panels
+
+
+def illustration_consistency(image_paths: Sequence[str]) -> Optional[float]:
+    """
+    Cheap visual consistency score for a sequence of page images.
+
+    Mean color-histogram intersection between consecutive pages, in [0, 1].
+    Returns None if fewer than two images are available.
+    """
+    if len(image_paths) < 2:
+        return None
+    Image = _require_pil()
+
+    histograms = []
+    for path in image_paths:
+        with Image.open(path) as img:
+            small = img.convert("RGB").resize((64, 64))
+            # 8 bins per channel -> 512-bin joint color histogram
+            counts = [0] * 512
+            for r, g, b in small.getdata():
+                counts[(r >> 5) * 64 + (g >> 5) * 8 + (b >> 5)] += 1
+            total = float(sum(counts))
+            histograms.append([c / total for c in counts])
+
+    scores = [
+        sum(min(a, b) for a, b in zip(prev, curr))
+        for prev, curr in zip(histograms, histograms[1:])
+    ]
+    return sum(scores) / len(scores)
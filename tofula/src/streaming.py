@@ -0,0 +1,162 @@
+"""
+Incremental parsing of streamed LLM output.
+
+The illustration chain returns an IllustrationPrompts JSON document. When the
+chain is streamed, IncrementalPromptParser picks each complete
+IllustrationPrompt object out of the ``"prompts"`` array as soon as its
+closing brace arrives, so image generation can start before the LLM has
+finished writing prompts for later pages.
+"""
+
+import contextvars
+import json
+import logging
+import queue
+import threading
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional, TypeVar
+
+from pydantic import ValidationError
+
+from tofula.src.deadline import DeadlineExceeded
+from tofula.src.structures import IllustrationPrompt
+
+if TYPE_CHECKING:
+    from tofula.src.deadline import Deadline
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class IncrementalPromptParser:
+    """
+    Extract IllustrationPrompt objects from a partially received JSON document.
+
+    Text is fed in arbitrary chunks (markdown code fences around the JSON are
+    tolerated). Only characters not yet scanned are examined on each feed.
+    """
+
+    def __init__(self, array_key: str = "prompts"):
+        self._key = f'"{array_key}"'
+        self._buffer = ""
+        self._pos = 0
+        self._in_array = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._object_start = -1
+
+    @property
+    def done(self) -> bool:
+        """True once the closing bracket of the prompts array was seen."""
+        return self._done
+
+    @property
+    def text(self) -> str:
+        """All text received so far."""
+        return self._buffer
+
+    def feed(self, chunk: str) -> List[IllustrationPrompt]:
+        """Add a chunk of streamed text and return newly completed prompts."""
+        self._buffer += chunk
+        if self._done:
+            return []
+
+        if not self._in_array:
+            key_index = self._buffer.find(self._key)
+            if key_index < 0:
+                return []
+            bracket = self._buffer.find("[", key_index + len(self._key))
+            if bracket < 0:
+                return []
+            self._in_array = True
+            self._pos = bracket + 1
+
+        completed: List[IllustrationPrompt] = []
+        buffer = self._buffer
+        while self._pos < len(buffer):
+            char = buffer[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                if self._depth == 0:
+                    self._object_start = self._pos
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    prompt = self._parse_object(
+                        buffer[self._object_start : self._pos + 1]
+                    )
+                    if prompt is not None:
+                        completed.append(prompt)
+            elif char == "]" and self._depth == 0:
+                self._done = True
+                self._pos += 1
+                break
+            self._pos += 1
+        return completed
+
+    @staticmethod
+    def _parse_object(raw: str):
+        try:
+            return IllustrationPrompt.model_validate(json.loads(raw))
+        except (json.JSONDecodeError, ValidationError) as e:
+            logger.warning("Skipping malformed streamed illustration prompt: %s", e)
+            return None
+
+
+_DONE = object()
+
+
+def prefetch(
+    items: Iterable[T], maxsize: int = 0, deadline: Optional["Deadline"] = None
+) -> Iterator[T]:
+    """
+    Consume an iterable on a background thread and yield its items.
+
+    The producer keeps running while the consumer is busy, so a slow consumer
+    (e.g. image generation) overlaps with a slow producer (e.g. an LLM stream).
+    Exceptions raised by the producer are re-raised in the consumer. If a
+    deadline is given, waiting for the next item past it raises
+    DeadlineExceeded.
+    """
+    buffer: queue.Queue = queue.Queue(maxsize=maxsize)
+
+    def _produce():
+        try:
+            for item in items:
+                buffer.put(item)
+        except BaseException as e:
+            buffer.put(e)
+        finally:
+            buffer.put(_DONE)
+
+    thread = threading.Thread(
+        target=contextvars.copy_context().run,
+        args=(_produce,),
+        name="tofula-prefetch",
+        daemon=True,
+    )
+    thread.start()
+    while True:
+        timeout = None
+        if deadline is not None and deadline.enabled:
+            timeout = deadline.remaining()
+        try:
+            item = buffer.get(timeout=timeout)
+        except queue.Empty:
+            raise DeadlineExceeded("Timed out waiting for streamed items") from None
+        if item is _DONE:
+            break
+        if isinstance(item, BaseException):
+            raise item
+        yield item
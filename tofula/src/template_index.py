@@ -0,0 +1,203 @@
+"""
+Local similarity index of previously generated story templates.
+
+Most requests reuse a small set of near-duplicate theme combinations
+("loyalty, sacrifice, endurance" / "Endurance and loyalty, sacrifice"). The
+index keeps every StoryTemplate produced by the template stage, keyed by the
+normalized themes and the child's age, and serves a stored template when a new
+request is similar enough, skipping the LLM call.
+
+Themes are embedded with a small local vectorizer (word and character-trigram
+counts, cosine similarity); nothing leaves the machine. The index can persist
+to a JSONL file so it survives restarts.
+"""
+
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from tofula.src.structures import StoryTemplate
+
+logger = logging.getLogger(__name__)
+
+_THEME_SEPARATORS = re.compile(r"[,;/&+]|\band\b")
+_NON_WORD = re.compile(r"[^a-z0-9 ]+")
+_STOPWORDS = {"a", "an", "the", "of", "in", "on", "to", "for", "with", "about"}
+
+
+def _stem(word: str) -> str:
+    """Very small suffix stripper so 'friendships' matches 'friendship'."""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def normalize_themes(themes: str) -> List[str]:
+    """Split a theme string into sorted, de-duplicated, normalized themes."""
+    normalized = set()
+    for theme in _THEME_SEPARATORS.split(themes.lower()):
+        words = [w for w in _NON_WORD.sub(" ", theme).split() if w not in _STOPWORDS]
+        if words:
+            normalized.add(" ".join(_stem(w) for w in words))
+    return sorted(normalized)
+
+
+def theme_vector(themes: List[str]) -> Dict[str, float]:
+    """L2-normalized bag of words and character trigrams for normalized themes."""
+    counts: Counter = Counter()
+    for theme in themes:
+        for word in theme.split():
+            counts[f"w:{word}"] += 1.0
+            padded = f" {word} "
+            for i in range(len(padded) - 2):
+                counts[f"c:{padded[i:i + 3]}"] += 0.5
+    norm = math.sqrt(sum(v * v for v in counts.values()))
+    if not norm:
+        return {}
+    return {k: v / norm for k, v in counts.items()}
+
+
+def cosine_similarity(a: Dict[str, float], b: Dict[str, float]) -> float:
+    """Cosine similarity of two normalized sparse vectors."""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+@dataclass
+class _Entry:
+    themes: List[str]
+    age: int
+    template: StoryTemplate
+    latency: float
+    vector: Dict[str, float]
+
+
+class TemplateIndex:
+    """
+    Similarity index of generated StoryTemplates.
+
+    Args:
+        path: Optional JSONL file the index is loaded from and appended to
+        threshold: Minimum cosine similarity of the themes to serve a hit
+        age_tolerance: Maximum age difference between request and entry
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        threshold: float = 0.9,
+        age_tolerance: int = 1,
+    ):
+        self.path = path
+        self.threshold = threshold
+        self.age_tolerance = age_tolerance
+        self._entries: List[_Entry] = []
+        self._keys = set()
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.latency_saved = 0.0
+        if path and os.path.exists(path):
+            self._load(path)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _load(self, path: str) -> None:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                self._insert(
+                    record["themes"],
+                    record["age"],
+                    StoryTemplate.model_validate(record["template"]),
+                    record.get("latency", 0.0),
+                )
+        logger.info("Loaded %s templates from %s", len(self._entries), path)
+
+    def _insert(
+        self, themes: List[str], age: int, template: StoryTemplate, latency: float
+    ) -> bool:
+        key = (tuple(themes), age)
+        if key in self._keys:
+            return False
+        self._keys.add(key)
+        self._entries.append(
+            _Entry(themes, age, template, latency, theme_vector(themes))
+        )
+        return True
+
+    def lookup(self, themes: str, age: int) -> Optional[Tuple[StoryTemplate, float]]:
+        """
+        Find the most similar stored template for a request.
+
+        Returns the template and its similarity if it reaches the threshold,
+        otherwise None.
+        """
+        normalized = normalize_themes(themes)
+        vector = theme_vector(normalized)
+        with self._lock:
+            self.lookups += 1
+            best, best_score = None, 0.0
+            for entry in self._entries:
+                if abs(entry.age - age) > self.age_tolerance:
+                    continue
+                score = cosine_similarity(vector, entry.vector)
+                if score > best_score:
+                    best, best_score = entry, score
+            if best is None or best_score < self.threshold:
+                return None
+            self.hits += 1
+            self.latency_saved += best.latency
+        logger.info(
+            "Template index hit for %s (age %s): %s, similarity %.3f",
+            normalized,
+            age,
+            best.themes,
+            best_score,
+        )
+        return best.template, best_score
+
+    def add(
+        self, themes: str, age: int, template: StoryTemplate, latency: float = 0.0
+    ) -> None:
+        """Store a generated template and the time the LLM took to produce it."""
+        normalized = normalize_themes(themes)
+        with self._lock:
+            if not self._insert(normalized, age, template, latency):
+                return
+            if self.path:
+                parent = os.path.dirname(self.path)
+                if parent:
+                    os.makedirs(parent, exist_ok=True)
+                record = {
+                    "themes": normalized,
+                    "age": age,
+                    "latency": latency,
+                    "template": template.model_dump(),
+                }
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+
+    @property
+    def stats(self) -> dict:
+        """Lookup count, hit rate and LLM latency saved by hits."""
+        with self._lock:
+            return {
+                "templates": len(self._entries),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "latency_saved_seconds": round(self.latency_saved, 3),
+            }
@@ -0,0 +1,294 @@
+"""
+Optional span tracing for pipeline runs, exported as Chrome trace events.
+
+Activate a Tracer around a run to record:
+  - LangChain chain invokes, prompt renders, parser calls and LLM calls
+    (through a callback handler, with LangChain's own parent/child links)
+  - image requests, file writes, sink flushes and PDF page renders
+    (through ``span(...)`` blocks in the pipeline code)
+
+Each span records its parent, thread and asyncio task. The exported JSON
+opens in Perfetto (ui.perfetto.dev) or chrome://tracing. With no active
+tracer, ``span`` is a no-op.
+"""
+
+import asyncio
+import contextvars
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+_current_span: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar(
+    "tofula_current_span", default=None
+)
+_active_tracer: Optional["Tracer"] = None
+
+
+@dataclass
+class Span:
+    """A single timed operation."""
+
+    span_id: int
+    parent_id: Optional[int]
+    name: str
+    category: str
+    start_ns: int
+    thread_id: int
+    thread_name: str
+    task: Optional[str] = None
+    end_ns: Optional[int] = None
+    args: Dict[str, Any] = field(default_factory=dict)
+
+
+def _current_task_name() -> Optional[str]:
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        return None
+    return task.get_name() if task else None
+
+
+class Tracer:
+    """Collects spans from all threads of a run."""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self._origin_ns = time.perf_counter_ns()
+        self._ids = itertools.count(1)
+        self._spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    # --- Recording ------------------------------------------------------
+
+    def start_span(
+        self,
+        name: str,
+        category: str = "tofula",
+        parent_id: Optional[int] = None,
+        **args,
+    ) -> Span:
+        """Open a span; the parent defaults to the current span of this context."""
+        thread = threading.current_thread()
+        span = Span(
+            span_id=next(self._ids),
+            parent_id=parent_id if parent_id is not None else _current_span.get(),
+            name=name,
+            category=category,
+            start_ns=time.perf_counter_ns(),
+            thread_id=thread.native_id or thread.ident,
+            thread_name=thread.name,
+            task=_current_task_name(),
+            args=args,
+        )
+        with self._lock:
+            self._spans.append(span)
+        return span
+
+    def end_span(self, span: Span, **args) -> None:
+        span.end_ns = time.perf_counter_ns()
+        span.args.update(args)
+
+    @contextmanager
+    def span(self, name: str, category: str = "tofula", **args):
+        """Record the enclosed block as a span nested under the current one."""
+        span = self.start_span(name, category, **args)
+        token = _current_span.set(span.span_id)
+        try:
+            yield span
+        except BaseException as e:
+            span.args["error"] = repr(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            self.end_span(span)
+
+    def callback_handler(self) -> "TracingCallbackHandler":
+        """LangChain callback handler recording chain/prompt/parser/LLM spans."""
+        return TracingCallbackHandler(self)
+
+    @contextmanager
+    def activate(self):
+        """Make this the tracer used by ``span`` and the pipeline."""
+        global _active_tracer
+        previous, _active_tracer = _active_tracer, self
+        try:
+            yield self
+        finally:
+            _active_tracer = previous
+
+    # --- Export ---------------------------------------------------------
+
+    def _us(self, ns: int) -> float:
+        return (ns - self._origin_ns) / 1000.0
+
+    def to_chrome_trace(self) -> dict:
+        """Build a Chrome trace-event document for all finished spans."""
+        with self._lock:
+            spans = [s for s in self._spans if s.end_ns is not None]
+        by_id = {s.span_id: s for s in spans}
+
+        events: List[dict] = []
+        threads = {}
+        for s in spans:
+            threads.setdefault(s.thread_id, s.thread_name)
+            args = {"span_id": s.span_id, "parent_id": s.parent_id, **s.args}
+            if s.task:
+                args["task"] = s.task
+            events.append(
+                {
+                    "name": s.name,
+                    "cat": s.category,
+                    "ph": "X",
+                    "ts": self._us(s.start_ns),
+                    "dur": (s.end_ns - s.start_ns) / 1000.0,
+                    "pid": self.pid,
+                    "tid": s.thread_id,
+                    "args": {k: _jsonable(v) for k, v in args.items()},
+                }
+            )
+            # Draw an arrow when a child runs on a different thread
+            parent = by_id.get(s.parent_id)
+            if parent is not None and parent.thread_id != s.thread_id:
+                flow = {"name": "spawn", "cat": "flow", "id": s.span_id}
+                events.append(
+                    {
+                        **flow,
+                        "ph": "s",
+                        "ts": self._us(s.start_ns),
+                        "pid": self.pid,
+                        "tid": parent.thread_id,
+                    }
+                )
+                events.append(
+                    {
+                        **flow,
+                        "ph": "f",
+                        "bp": "e",
+                        "ts": self._us(s.start_ns),
+                        "pid": self.pid,
+                        "tid": s.thread_id,
+                    }
+                )
+
+        for thread_id, thread_name in threads.items():
+            events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": self.pid,
+                    "tid": thread_id,
+                    "args": {"name": thread_name},
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path: str) -> None:
+        """Write the trace as JSON (open it in Perfetto or chrome://tracing)."""
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_chrome_trace(), f)
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Turns LangChain run callbacks into tracer spans."""
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+        self._runs: Dict[UUID, Span] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, name: str, category: str, run_id: UUID, parent_run_id):
+        with self._lock:
+            parent = self._runs.get(parent_run_id) if parent_run_id else None
+        span = self.tracer.start_span(
+            name,
+            category,
+            parent_id=parent.span_id if parent is not None else None,
+        )
+        with self._lock:
+            self._runs[run_id] = span
+
+    def _end(self, run_id: UUID, **args) -> None:
+        with self._lock:
+            span = self._runs.pop(run_id, None)
+        if span is not None:
+            self.tracer.end_span(span, **args)
+
+    def on_chain_start(
+        self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs
+    ) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name") or "chain"
+        if "Prompt" in name:
+            category = "prompt"
+        elif "Parser" in name:
+            category = "parser"
+        else:
+            category = "chain"
+        self._start(name, category, run_id, parent_run_id)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs) -> None:
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs) -> None:
+        self._end(run_id, error=repr(error))
+
+    def on_chat_model_start(
+        self, serialized, messages, *, run_id, parent_run_id=None, **kwargs
+    ) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name") or "chat_model"
+        self._start(name, "llm", run_id, parent_run_id)
+
+    def on_llm_start(
+        self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs
+    ) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name") or "llm"
+        self._start(name, "llm", run_id, parent_run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        self._end(run_id, error=repr(error))
+
+
+def get_tracer() -> Optional[Tracer]:
+    """Return the active tracer, if any."""
+    return _active_tracer
+
+
+def span(name: str, category: str = "tofula", **args):
+    """Span context manager on the active tracer (no-op without one)."""
+    tracer = _active_tracer
+    if tracer is None:
+        return nullcontext()
+    return tracer.span(name, category, **args)
+
+
+def propagate(fn):
+    """Bind ``fn`` to a copy of the current context, for use on another thread."""
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+def chain_config() -> Optional[dict]:
+    """LangChain invoke config that routes callbacks to the active tracer."""
+    tracer = _active_tracer
+    if tracer is None:
+        return None
+    return {"callbacks": [tracer.callback_handler()]}
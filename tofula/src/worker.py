@@ -0,0 +1,138 @@
+"""
+Story worker: generates stories for jobs pulled from a shared JobQueue.
+
+Run one worker per process (``tofula worker --queue ...``); start more
+processes, on this or other hosts sharing the queue, to scale throughput.
+While a story is generated, a background thread renews the job's lease. If
+the lease is lost (e.g. the worker stalled and the job was handed to another
+worker), the result is discarded.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Optional
+
+from tofula.src.job_queue import Job, JobQueue
+from tofula.src.pipeline import StoryGenerationPipeline
+
+logger = logging.getLogger(__name__)
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:4]}"
+
+
+class _Heartbeat:
+    """Renews a job lease every lease_seconds / 3 until stopped."""
+
+    def __init__(self, queue: JobQueue, job: Job, lease_seconds: float):
+        self.queue = queue
+        self.job = job
+        self.lease_seconds = lease_seconds
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name=f"tofula-heartbeat-{job.job_id}", daemon=True
+        )
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                alive = self.queue.heartbeat(self.job, self.lease_seconds)
+            except Exception as e:
+                logger.warning("Heartbeat for job %s failed: %s", self.job.job_id, e)
+                continue
+            if not alive:
+                logger.warning("Lost the lease on job %s", self.job.job_id)
+                self.lost.set()
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+
+def run_worker(
+    queue: JobQueue,
+    pipeline: StoryGenerationPipeline,
+    worker_id: Optional[str] = None,
+    lease_seconds: float = 120.0,
+    poll_interval: float = 2.0,
+    max_jobs: Optional[int] = None,
+    exit_when_empty: bool = False,
+) -> dict:
+    """
+    Claim and process jobs until stopped.
+
+    Each job's payload is passed to ``pipeline.generate_story``; illustrations
+    go to the queue's shared artifact directory for the job and the story JSON
+    is stored as the job result. A failing job is returned to the queue until
+    it reaches the queue's max_attempts.
+
+    Args:
+        queue: Shared job queue
+        pipeline: Configured story pipeline
+        worker_id: Name recorded on claimed jobs (hostname-pid by default)
+        lease_seconds: Lease length; renewed every third of it
+        poll_interval: Sleep between claims when the queue is empty
+        max_jobs: Stop after this many jobs (None = no limit)
+        exit_when_empty: Stop once no job is available
+
+    Returns:
+        Counts of completed, failed and discarded (lease lost) jobs
+    """
+    worker_id = worker_id or default_worker_id()
+    stats = {"worker": worker_id, "completed": 0, "failed": 0, "discarded": 0}
+    processed = 0
+    logger.info("Worker %s started", worker_id)
+
+    while max_jobs is None or processed < max_jobs:
+        job = queue.claim(worker_id, lease_seconds)
+        if job is None:
+            if exit_when_empty:
+                break
+            time.sleep(poll_interval)
+            continue
+
+        processed += 1
+        logger.info(
+            "Worker %s claimed job %s (attempt %s)", worker_id, job.job_id, job.attempts
+        )
+        start = time.perf_counter()
+        with _Heartbeat(queue, job, lease_seconds) as heartbeat:
+            try:
+                story = pipeline.generate_story(
+                    **job.payload, output_dir=queue.artifact_dir(job.job_id)
+                )
+            except KeyboardInterrupt:
+                queue.fail(job, "worker interrupted")
+                raise
+            except Exception as e:
+                logger.error("Job %s failed: %s", job.job_id, str(e))
+                queue.fail(job, str(e))
+                stats["failed"] += 1
+                continue
+
+        if heartbeat.lost.is_set() or not queue.complete(job, story.model_dump_json()):
+            logger.warning("Discarding result of job %s: lease lost", job.job_id)
+            stats["discarded"] += 1
+            continue
+        stats["completed"] += 1
+        logger.info(
+            "✓ Job %s done in %.1fs: %s",
+            job.job_id,
+            time.perf_counter() - start,
+            story.title,
+        )
+
+    logger.info("Worker %s stopped: %s", worker_id, stats)
+    return stats